@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import zlib
+
+from tensorflow.core.framework import summary_pb2
+from tensorflow.core.util import event_pb2
+
+from .logging import get_logger
+
+_logger = get_logger()
+
+# Bumped whenever the contents of a snapshot change, so that snapshots from older versions are ignored
+_SNAPSHOT_VERSION = 2
+_SNAPSHOT_MAGIC = b'grtbsnap'
+# Each record of a snapshot is its uint64 length and uint32 zlib crc32 followed by its data
+_SNAPSHOT_RECORD_HEADER = struct.Struct('<QI')
+
+# A TFRecord is a uint64 length, a uint32 masked crc32c of the length, the data and a uint32 masked crc32c of the data
+_HEADER_BYTES = 12
+_FOOTER_BYTES = 4
+
+def _crc32c_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+_CRC32C_TABLE = _crc32c_table()
+
+def _masked_crc32c(data):
+    # Only ever used on the 8 bytes of a record length, so a table driven python implementation is fast enough
+    crc = 0xFFFFFFFF
+    for byte in bytearray(data):
+        crc = _CRC32C_TABLE[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    crc ^= 0xFFFFFFFF
+    return (((crc >> 15) | (crc << 17)) + 0xa282ead8) & 0xFFFFFFFF
+
+class OffsetEventFileLoader:
+    """Reads the events of an events file from a byte offset, remembering how far it has read.
+
+    This stands in for tensorboard's EventFileLoader so that the position of an accumulator in each of its events
+    files can be snapshotted and restored, and a restarted accumulator does not parse the events it has already seen
+    again. A record which has only been partly written is left for the next Load. As with EventFileLoader, reading
+    stops at a record whose length fails its crc (the file is torn or corrupt there) rather than trusting the length.
+    The crcs of the record data are not checked.
+    """
+    def __init__(self, file_path, offset=0):
+        self._file_path = file_path
+        self.offset = offset
+
+    def Load(self):
+        with open(self._file_path, 'rb') as events_file:
+            events_file.seek(self.offset)
+            while True:
+                header = events_file.read(_HEADER_BYTES)
+                if len(header) < _HEADER_BYTES:
+                    return
+                length_bytes, length_crc = header[:8], struct.unpack('<I', header[8:])[0]
+                if _masked_crc32c(length_bytes) != length_crc:
+                    _logger.info("Stopped reading %s at the corrupt record at offset %d" % (self._file_path, self.offset))
+                    return
+                length, = struct.unpack('<Q', length_bytes)
+                data = events_file.read(length)
+                footer = events_file.read(_FOOTER_BYTES)
+                if len(data) < length or len(footer) < _FOOTER_BYTES:
+                    return
+                self.offset += _HEADER_BYTES + length + _FOOTER_BYTES
+                yield event_pb2.Event.FromString(data)
+
+def _snapshot_path(directory, name):
+    # Run names contain path separators so name the snapshots by a hash of the run
+    return os.path.join(directory, hashlib.sha1(name.encode('utf-8')).hexdigest() + '.snapshot')
+
+def _encode_snapshot(name, snapshot):
+    """Yields the records of a snapshot: a json header followed by serialized Event protos of the summary metadata and
+    the tensor events in the reservoir of each tag. Nothing but json and protobuf parsing is needed to read it back."""
+    tensors = snapshot['tensors']
+    header = {
+        'version': _SNAPSHOT_VERSION,
+        'name': name,
+        'offsets': snapshot['offsets'],
+        'attributes': snapshot['attributes'],
+        'streaming_aggregates': snapshot['streaming_aggregates'],
+        'num_metadata': len(snapshot['summary_metadata']),
+        'tensors': {tag: [len(items), num_items_seen] for tag, (items, num_items_seen) in tensors.items()},
+    }
+    yield json.dumps(header, sort_keys=True).encode('utf-8')
+    for tag, metadata in sorted(snapshot['summary_metadata'].items()):
+        yield event_pb2.Event(summary=summary_pb2.Summary(value=[
+            summary_pb2.Summary.Value(tag=tag, metadata=metadata)])).SerializeToString()
+    for tag in sorted(tensors):
+        for item in tensors[tag][0]:
+            yield event_pb2.Event(wall_time=item.wall_time, step=item.step, summary=summary_pb2.Summary(value=[
+                summary_pb2.Summary.Value(tag=tag, tensor=item.tensor_proto)])).SerializeToString()
+
+def _read_records(data):
+    if not data.startswith(_SNAPSHOT_MAGIC):
+        raise ValueError("Not a snapshot")
+    position = len(_SNAPSHOT_MAGIC)
+    while position < len(data):
+        length, crc = _SNAPSHOT_RECORD_HEADER.unpack_from(data, position)
+        position += _SNAPSHOT_RECORD_HEADER.size
+        record = data[position:position + length]
+        if len(record) != length or zlib.crc32(record) & 0xFFFFFFFF != crc:
+            raise ValueError("Corrupt record at offset %d" % position)
+        position += length
+        yield record
+
+def _decode_snapshot(data):
+    """Parses the records written by _encode_snapshot into the header and the snapshot to restore"""
+    records = _read_records(data)
+    header = json.loads(next(records).decode('utf-8'))
+    if header.get('version') != _SNAPSHOT_VERSION:
+        return header, None
+    summary_metadata = {}
+    for _ in range(header['num_metadata']):
+        value = event_pb2.Event.FromString(next(records)).summary.value[0]
+        summary_metadata[value.tag] = value.metadata
+    tensors = {}
+    for tag in sorted(header['tensors']):
+        num_items, num_items_seen = header['tensors'][tag]
+        items = []
+        for _ in range(num_items):
+            event = event_pb2.Event.FromString(next(records))
+            items.append((event.wall_time, event.step, event.summary.value[0].tensor))
+        tensors[tag] = (items, num_items_seen)
+    return header, {
+        'offsets': header['offsets'],
+        'attributes': header['attributes'],
+        'summary_metadata': summary_metadata,
+        'streaming_aggregates': header['streaming_aggregates'],
+        'tensors': tensors,
+    }
+
+def save_snapshots(multiplexer, directory):
+    """Saves the state of every accumulator of the multiplexer which supports snapshots into the directory,
+    returning the number saved. Snapshots of runs which are no longer enabled are removed."""
+    os.makedirs(directory, exist_ok=True)
+    with multiplexer._accumulators_mutex:
+        accumulators = dict(multiplexer._accumulators)
+    saved = set()
+    for name, accumulator in accumulators.items():
+        snapshot_method = getattr(accumulator, 'Snapshot', None)
+        snapshot = snapshot_method() if snapshot_method is not None else None
+        if snapshot is None:
+            continue
+        path = _snapshot_path(directory, name)
+        try:
+            with tempfile.NamedTemporaryFile('wb', dir=directory, delete=False, suffix='.tmp') as snapshot_file:
+                snapshot_file.write(_SNAPSHOT_MAGIC)
+                for record in _encode_snapshot(name, snapshot):
+                    snapshot_file.write(_SNAPSHOT_RECORD_HEADER.pack(len(record), zlib.crc32(record) & 0xFFFFFFFF))
+                    snapshot_file.write(record)
+            os.replace(snapshot_file.name, path)
+            saved.add(os.path.basename(path))
+        except OSError as e:
+            _logger.info("Unable to snapshot accumulator '%s': %s" % (name, e))
+    for file_name in os.listdir(directory):
+        if file_name.endswith('.snapshot') and file_name not in saved:
+            os.remove(os.path.join(directory, file_name))
+    return len(saved)
+
+def restore_snapshots(multiplexer, directory):
+    """Restores the accumulators of the multiplexer which have not been loaded yet from their snapshots in the
+    directory, returning the number restored. Accumulators whose events files have changed since they were
+    snapshotted (e.g. were truncated) are left to load from scratch."""
+    if not os.path.isdir(directory):
+        return 0
+    with multiplexer._accumulators_mutex:
+        accumulators = dict(multiplexer._accumulators)
+    restored = 0
+    for name, accumulator in accumulators.items():
+        restore_method = getattr(accumulator, 'RestoreSnapshot', None)
+        path = _snapshot_path(directory, name)
+        if restore_method is None or not os.path.exists(path):
+            continue
+        try:
+            with open(path, 'rb') as snapshot_file:
+                header, snapshot = _decode_snapshot(snapshot_file.read())
+        except Exception as e:
+            _logger.info("Unable to read the snapshot of accumulator '%s': %s" % (name, e))
+            continue
+        if snapshot is not None and header.get('name') == name and restore_method(snapshot):
+            restored += 1
+    return restored
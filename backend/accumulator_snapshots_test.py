@@ -0,0 +1,126 @@
+import collections
+import struct
+import zlib
+
+import pytest
+
+pytest.importorskip('tensorflow')
+
+from tensorflow.core.framework import summary_pb2
+from tensorflow.core.framework import tensor_pb2
+from tensorflow.core.framework import types_pb2
+from tensorflow.core.util import event_pb2
+
+from gr_tensorboard.backend import accumulator_snapshots
+
+TensorItem = collections.namedtuple('TensorItem', ['wall_time', 'step', 'tensor_proto'])
+
+def _mask(crc):
+    return (((crc >> 15) | (crc << 17)) + 0xa282ead8) & 0xFFFFFFFF
+
+def _tfrecord(data):
+    length = struct.pack('<Q', len(data))
+    return (length + struct.pack('<I', accumulator_snapshots._masked_crc32c(length))
+            + data + struct.pack('<I', accumulator_snapshots._masked_crc32c(data)))
+
+def _event(step):
+    return event_pb2.Event(wall_time=1000.0 + step, step=step).SerializeToString()
+
+def _snapshot_data(records):
+    data = accumulator_snapshots._SNAPSHOT_MAGIC
+    for record in records:
+        data += accumulator_snapshots._SNAPSHOT_RECORD_HEADER.pack(len(record), zlib.crc32(record) & 0xFFFFFFFF)
+        data += record
+    return data
+
+def test_masked_crc32c():
+    # the crc32c check value, the crc of no data and the first entry of the crc32c table
+    assert accumulator_snapshots._masked_crc32c(b'123456789') == _mask(0xE3069283)
+    assert accumulator_snapshots._masked_crc32c(b'') == _mask(0)
+    assert accumulator_snapshots._CRC32C_TABLE[1] == 0xF26B8303
+
+def test_load_resumes_from_offset(tmp_path):
+    path = tmp_path / 'events.out.tfevents.1546300800.host'
+    first = _tfrecord(_event(0)) + _tfrecord(_event(1))
+    path.write_bytes(first)
+
+    loader = accumulator_snapshots.OffsetEventFileLoader(str(path))
+    assert [event.step for event in loader.Load()] == [0, 1]
+    assert loader.offset == len(first)
+    assert list(loader.Load()) == []
+
+    loader = accumulator_snapshots.OffsetEventFileLoader(str(path), len(_tfrecord(_event(0))))
+    assert [event.step for event in loader.Load()] == [1]
+    assert loader.offset == len(first)
+
+def test_load_leaves_partial_records(tmp_path):
+    path = tmp_path / 'events.out.tfevents.1546300800.host'
+    record = _tfrecord(_event(2))
+    path.write_bytes(_tfrecord(_event(1)) + record[:5])
+    loader = accumulator_snapshots.OffsetEventFileLoader(str(path))
+    assert [event.step for event in loader.Load()] == [1]
+    offset = loader.offset
+
+    # a complete header without all of the data or its crc is still a partial record
+    with open(str(path), 'ab') as events_file:
+        events_file.write(record[5:-2])
+    assert list(loader.Load()) == []
+    assert loader.offset == offset
+
+    with open(str(path), 'ab') as events_file:
+        events_file.write(record[-2:])
+    assert [event.step for event in loader.Load()] == [2]
+    assert loader.offset == offset + len(record)
+
+def test_load_stops_at_corrupt_length(tmp_path):
+    path = tmp_path / 'events.out.tfevents.1546300800.host'
+    corrupt = bytearray(_tfrecord(_event(1)))
+    corrupt[0] ^= 0xFF
+    path.write_bytes(_tfrecord(_event(0)) + bytes(corrupt) + _tfrecord(_event(2)))
+    loader = accumulator_snapshots.OffsetEventFileLoader(str(path))
+    assert [event.step for event in loader.Load()] == [0]
+    assert loader.offset == len(_tfrecord(_event(0)))
+
+def test_read_records():
+    assert list(accumulator_snapshots._read_records(_snapshot_data([b'header', b'', b'record']))) == [
+        b'header', b'', b'record']
+
+def test_read_records_rejects_bad_snapshots():
+    with pytest.raises(ValueError):
+        list(accumulator_snapshots._read_records(b'not a snapshot'))
+    data = _snapshot_data([b'header', b'record'])
+    with pytest.raises(ValueError):
+        list(accumulator_snapshots._read_records(data[:-1]))
+    with pytest.raises(ValueError):
+        list(accumulator_snapshots._read_records(data[:-1] + b'x'))
+
+def test_snapshot_round_trip():
+    metadata = summary_pb2.SummaryMetadata(
+        plugin_data=summary_pb2.SummaryMetadata.PluginData(plugin_name='scalars'))
+    items = [TensorItem(1000.0 + step, step, tensor_pb2.TensorProto(dtype=types_pb2.DT_FLOAT, float_val=[step / 2]))
+             for step in range(3)]
+    snapshot = {
+        'offsets': {'/logdir/run/events.out.tfevents.1546300800.host': 123},
+        'attributes': {'first_event_timestamp': 1000.0},
+        'streaming_aggregates': {'loss': [1.0, 2.0]},
+        'summary_metadata': {'loss': metadata, 'accuracy': metadata},
+        'tensors': {'loss': (items, 5), 'accuracy': ([], 0)},
+    }
+    data = _snapshot_data(accumulator_snapshots._encode_snapshot('run', snapshot))
+
+    header, restored = accumulator_snapshots._decode_snapshot(data)
+    assert header['name'] == 'run'
+    for key in ('offsets', 'attributes', 'streaming_aggregates', 'summary_metadata'):
+        assert restored[key] == snapshot[key]
+    assert restored['tensors'] == {
+        'loss': ([(item.wall_time, item.step, item.tensor_proto) for item in items], 5),
+        'accuracy': ([], 0),
+    }
+
+def test_snapshot_from_another_version_is_ignored(monkeypatch):
+    snapshot = {'offsets': {}, 'attributes': {}, 'streaming_aggregates': {}, 'summary_metadata': {}, 'tensors': {}}
+    data = _snapshot_data(accumulator_snapshots._encode_snapshot('run', snapshot))
+    monkeypatch.setattr(accumulator_snapshots, '_SNAPSHOT_VERSION', accumulator_snapshots._SNAPSHOT_VERSION + 1)
+    header, restored = accumulator_snapshots._decode_snapshot(data)
+    assert header['name'] == 'run'
+    assert restored is None
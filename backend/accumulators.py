@@ -0,0 +1,222 @@
+import collections
+import math
+import os
+import re
+
+import tensorflow as tf
+from tensorboard.backend.event_processing import directory_watcher
+from tensorboard.backend.event_processing import io_wrapper
+from tensorboard.backend.event_processing import plugin_event_accumulator
+from tensorboard.backend.event_processing import plugin_event_multiplexer
+from tensorboard.backend.event_processing import reservoir
+
+from .accumulator_snapshots import OffsetEventFileLoader
+
+# The attributes of an EventAccumulator (besides its reservoirs and summary metadata) which are restored from a snapshot
+_SNAPSHOT_ATTRIBUTES = ('file_version', 'most_recent_step', 'most_recent_wall_time', '_first_event_timestamp')
+
+def parse_size_guidance(spec):
+    """Parses a size guidance flag of the form key=size,key=size into a list of (key, size) pairs, in order.
+
+    A size of 0 keeps every event. The key is everything before the last '=' so that it may itself be a regex.
+    """
+    guidance = []
+    for item in filter(None, (item.strip() for item in (spec or '').split(','))):
+        key, separator, size = item.rpartition('=')
+        if not separator or not key:
+            raise ValueError("Expected key=size but got '%s'" % item)
+        guidance.append((key, int(size)))
+    return guidance
+
+class StreamingAggregate:
+    """The exact count, sum, min, max and most recent value of every event of a scalar tag"""
+    __slots__ = ('count', 'sum', 'min', 'max', 'last_value', 'last_step')
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.last_value = math.nan
+        self.last_step = None
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, fields):
+        aggregate = cls()
+        for name in cls.__slots__:
+            setattr(aggregate, name, fields[name])
+        return aggregate
+
+    def add(self, step, value):
+        if self.last_step is None or step >= self.last_step:
+            self.last_value = value
+            self.last_step = step
+        if math.isnan(value):
+            return
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+class GuidedEventAccumulator(plugin_event_accumulator.EventAccumulator):
+    """An EventAccumulator with per tag regex tensor size guidance, which can also keep exact streaming aggregates of
+    the scalar tags of some plugins.
+
+    The aggregates see every event of a tag, not just those kept in its reservoir, so plugins which only need the
+    min/max/mean/last value of a tag (like paramplot) get exact results however small the reservoir is.
+
+    With snapshots enabled the accumulator reads its events files with OffsetEventFileLoaders, so that its state can
+    be saved from Snapshot and restored into a fresh accumulator by RestoreSnapshot, which then carries on reading each
+    events file from where the snapshotted accumulator stopped.
+    """
+    def __init__(self, path, tag_size_guidance=None, streaming_plugins=(), snapshots=False, **kwargs):
+        super(GuidedEventAccumulator, self).__init__(path, **kwargs)
+        self._tag_size_guidance = tag_size_guidance or []
+        self._streaming_plugins = frozenset(streaming_plugins)
+        self._streaming_aggregates = {}
+        # Maps the path of each events file read so far to its loader, or None if snapshots are disabled
+        self._event_file_loaders = None
+        self._restored_offsets = {}
+        if snapshots and not io_wrapper.IsTensorFlowEventsFile(path):
+            self._event_file_loaders = {}
+            self._generator = directory_watcher.DirectoryWatcher(path, self._CreateEventFileLoader,
+                                                                 io_wrapper.IsTensorFlowEventsFile)
+
+    def _CreateEventFileLoader(self, file_path):
+        loader = OffsetEventFileLoader(file_path, self._restored_offsets.pop(file_path, 0))
+        self._event_file_loaders[file_path] = loader
+        return loader
+
+    def _GetTensorReservoirSize(self, tag):
+        # The first regex to match the tag wins, otherwise fall back to the per plugin guidance
+        for regex, size in self._tag_size_guidance:
+            if regex.search(tag):
+                return size
+        return super(GuidedEventAccumulator, self)._GetTensorReservoirSize(tag)
+
+    def _ProcessTensor(self, tag, wall_time, step, tensor):
+        if self._streaming_plugins:
+            metadata = self.summary_metadata.get(tag)
+            if metadata is not None and metadata.plugin_data.plugin_name in self._streaming_plugins:
+                try:
+                    value = float(tf.make_ndarray(tensor).item())
+                except ValueError:
+                    # Not a scalar, so there is nothing to aggregate
+                    value = None
+                if value is not None:
+                    if tag not in self._streaming_aggregates:
+                        self._streaming_aggregates[tag] = StreamingAggregate()
+                    self._streaming_aggregates[tag].add(step, value)
+        super(GuidedEventAccumulator, self)._ProcessTensor(tag, wall_time, step, tensor)
+
+    def GetStreamingAggregate(self, tag):
+        """Returns the StreamingAggregate of every event of the tag, or None if the tag is not aggregated"""
+        return self._streaming_aggregates.get(tag)
+
+    def Snapshot(self):
+        """Returns the state of the accumulator for accumulator_snapshots to save, or None if snapshots are disabled"""
+        if self._event_file_loaders is None:
+            return None
+        # Hold the generator mutex so that the offsets match the events in the reservoirs
+        with self._generator_mutex, self._tensors_by_tag_lock:
+            tensors = {}
+            for tag, tensor_reservoir in self.tensors_by_tag.items():
+                bucket = tensor_reservoir._buckets.get(plugin_event_accumulator._TENSOR_RESERVOIR_KEY)
+                if bucket is not None:
+                    tensors[tag] = (list(bucket.items), bucket._num_items_seen)
+            return {
+                'offsets': {os.path.basename(file_path): loader.offset
+                            for file_path, loader in self._event_file_loaders.items()},
+                'attributes': {name: getattr(self, name, None) for name in _SNAPSHOT_ATTRIBUTES},
+                'summary_metadata': dict(self.summary_metadata),
+                'streaming_aggregates': {tag: aggregate.to_dict() for tag, aggregate in self._streaming_aggregates.items()},
+                'tensors': tensors,
+            }
+
+    def RestoreSnapshot(self, snapshot):
+        """Restores the state returned by Snapshot into this accumulator, which must not have been loaded yet.
+
+        Returns whether the snapshot was restored, which it is not if an events file it read has since shrunk or
+        disappeared, as the events file must have been replaced.
+        """
+        if self._event_file_loaders is None or self._event_file_loaders:
+            return False
+        offsets = {os.path.join(self.path, name): offset for name, offset in snapshot['offsets'].items()}
+        for file_path, offset in offsets.items():
+            try:
+                if os.path.getsize(file_path) < offset:
+                    return False
+            except OSError:
+                return False
+
+        with self._generator_mutex, self._tensors_by_tag_lock:
+            for name, value in snapshot['attributes'].items():
+                setattr(self, name, value)
+            # The plugin contents are those of the summary metadata, just as when the events were first processed
+            self.summary_metadata = dict(snapshot['summary_metadata'])
+            self._plugin_to_tag_to_content = collections.defaultdict(dict)
+            for tag, metadata in self.summary_metadata.items():
+                if metadata.plugin_data.plugin_name:
+                    self._plugin_to_tag_to_content[metadata.plugin_data.plugin_name][tag] = metadata.plugin_data.content
+            self._streaming_aggregates = {tag: StreamingAggregate.from_dict(fields)
+                                          for tag, fields in snapshot['streaming_aggregates'].items()}
+            for tag, (items, num_items_seen) in snapshot['tensors'].items():
+                tensor_reservoir = reservoir.Reservoir(size=self._GetTensorReservoirSize(tag))
+                for wall_time, step, tensor_proto in items:
+                    tensor_reservoir.AddItem(plugin_event_accumulator._TENSOR_RESERVOIR_KEY,
+                                             plugin_event_accumulator.TensorEvent(wall_time, step, tensor_proto))
+                tensor_reservoir._buckets[plugin_event_accumulator._TENSOR_RESERVOIR_KEY]._num_items_seen = num_items_seen
+                self.tensors_by_tag[tag] = tensor_reservoir
+            self._restored_offsets = offsets
+        return True
+
+class GuidedEventMultiplexer(plugin_event_multiplexer.EventMultiplexer):
+    """An EventMultiplexer whose accumulators are GuidedEventAccumulators"""
+    def __init__(self, run_path_map=None, tag_size_guidance=None, streaming_plugins=(), snapshots=False, **kwargs):
+        self._tag_size_guidance = [(re.compile(regex), size) for regex, size in (tag_size_guidance or [])]
+        self._streaming_plugins = frozenset(streaming_plugins)
+        self.snapshots = snapshots
+        # Set to a LazyAccumulatorLoader when runs are loaded in the background after startup
+        self.lazy_loader = None
+        super(GuidedEventMultiplexer, self).__init__(run_path_map=run_path_map, **kwargs)
+
+    def GetAccumulator(self, run):
+        # A run which is accessed before the lazy loader has reached it is loaded on demand
+        if self.lazy_loader is not None:
+            self.lazy_loader.ensure_loaded(run)
+        return super(GuidedEventMultiplexer, self).GetAccumulator(run)
+
+    def CreateAccumulator(self, path):
+        return GuidedEventAccumulator(path,
+                                      tag_size_guidance=self._tag_size_guidance,
+                                      streaming_plugins=self._streaming_plugins,
+                                      snapshots=self.snapshots,
+                                      size_guidance=self._size_guidance,
+                                      tensor_size_guidance=self._tensor_size_guidance,
+                                      purge_orphaned_data=self.purge_orphaned_data)
+
+    def AddRun(self, path, name=None):
+        # Mirrors EventMultiplexer.AddRun, which always creates a plain EventAccumulator
+        name = name or path
+        accumulator = None
+        with self._accumulators_mutex:
+            if name not in self._accumulators or self._paths[name] != path:
+                accumulator = self.CreateAccumulator(path)
+                self._accumulators[name] = accumulator
+                self._paths[name] = path
+        if accumulator and self._reload_called:
+            accumulator.Reload()
+        return self
+
+def create_accumulator(multiplexer, path):
+    """Creates an accumulator for the path configured like the rest of the multiplexer's accumulators"""
+    if isinstance(multiplexer, GuidedEventMultiplexer):
+        return multiplexer.CreateAccumulator(path)
+    return plugin_event_accumulator.EventAccumulator(
+        path,
+        size_guidance=multiplexer._size_guidance,
+        tensor_size_guidance=multiplexer._tensor_size_guidance,
+        purge_orphaned_data=multiplexer.purge_orphaned_data)
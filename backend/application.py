@@ -1,23 +1,58 @@
 import os
+import threading
+import time
 
 from tensorboard.plugins import base_plugin
 from tensorboard.backend.event_processing import plugin_event_accumulator
 from tensorboard.backend import application
-from tensorboard.backend.event_processing import plugin_event_multiplexer
 
 from .logging import _logger
-import io_helpers
+from . import io_helpers
+from .crawler import crawl_run_mtimes, crawl_run_paths
+from .run_index import get_run_index
+from .recent_runs import load_mtime_index, save_mtime_index, select_most_recent, select_most_recent_from_index
+from .accumulators import GuidedEventMultiplexer, parse_size_guidance
+from .lazy_loader import LazyAccumulatorLoader
+from .metrics import MetricsMiddleware, get_metrics
+
+# The plugin whose tags paramplot aggregates, and which therefore gets exact streaming aggregates when asked for
+_PARAMPLOT_SOURCE_PLUGIN = 'scalars'
 
 def gr_tensorboard_wsgi(flags, plugin_loaders, assets_zip_provider):
-    size_guidance = {plugin_event_accumulator.TENSORS: 50}
-    run_path_map = _getRunPathMapFromLogdir(flags.logdir, flags.enable_first_N_runs)
+    startup_seconds = get_metrics().gauge('grtensorboard_startup_seconds',
+                                          'The time taken by each phase of starting the server', ('phase',))
+    start = time.time()
+    size_guidance = {plugin_event_accumulator.TENSORS: flags.tensor_size_guidance}
+    # Per plugin guidance applies to the tags of the plugin, while per tag regex guidance overrides both
+    tensor_size_guidance = dict(parse_size_guidance(flags.plugin_tensor_size_guidance)) or None
+    tag_size_guidance = parse_size_guidance(flags.tag_tensor_size_guidance)
+    streaming_plugins = [_PARAMPLOT_SOURCE_PLUGIN] if flags.paramplot_exact_aggregates else []
+    if flags.lazy_load or flags.enable_first_N_runs < 0:
+        # Every run is enabled so there is no need to wait for the crawl to finish - add accumulators as runs are found.
+        # Lazily loaded runs are discovered in the background once the server has started
+        run_path_map = {}
+    else:
+        run_path_map = _getRunPathMapFromLogdir(flags.logdir, flags.enable_first_N_runs,
+                                                flags.discovery_threads, flags.discovery_stop_at_runs,
+                                                flags.run_mtime_index)
     _logger.log_message_info("loading EventMultiplexer with the %d most recent runs enabled by default" % flags.enable_first_N_runs)
-    gr_multiplexer = plugin_event_multiplexer.EventMultiplexer(run_path_map=run_path_map,
-                                                                size_guidance=size_guidance,
-                                                                tensor_size_guidance=None,
-                                                                purge_orphaned_data=True,
-                                                                max_reload_threads=flags.max_reload_threads)
+    gr_multiplexer = GuidedEventMultiplexer(run_path_map=run_path_map,
+                                            tag_size_guidance=tag_size_guidance,
+                                            streaming_plugins=streaming_plugins,
+                                            snapshots=flags.warm_restart and flags.accumulator_snapshots,
+                                            size_guidance=size_guidance,
+                                            tensor_size_guidance=tensor_size_guidance,
+                                            purge_orphaned_data=True,
+                                            max_reload_threads=flags.max_reload_threads)
+    if flags.lazy_load:
+        gr_multiplexer.lazy_loader = LazyAccumulatorLoader(gr_multiplexer, flags.lazy_load_threads).start(
+            lambda: _discoverRuns(flags))
+    elif flags.enable_first_N_runs < 0:
+        for path in crawl_run_paths(flags.logdir, flags.discovery_threads, flags.discovery_stop_at_runs):
+            gr_multiplexer.AddRun(path, os.path.relpath(path, flags.logdir))
     _logger.log_message_info("Done loading EventMultiplexer")
+    startup_seconds.set(time.time() - start, phase='multiplexer')
+    start = time.time()
     _logger.log_message_info("Loading all plugins.")
     plugin_name_to_instance = {}
     context = base_plugin.TBContext(
@@ -35,14 +70,57 @@ def gr_tensorboard_wsgi(flags, plugin_loaders, assets_zip_provider):
         plugins.append(plugin)
         plugin_name_to_instance[plugin.plugin_name] = plugin
     _logger.log_message_info("Done loading all plugins, now launching the tensorboard application")
-    return application.TensorBoardWSGI(plugins, flags.path_prefix)
+    startup_seconds.set(time.time() - start, phase='plugins')
+    # Serve the metrics of the plugins and the backend where a Prometheus server expects them
+    return MetricsMiddleware(application.TensorBoardWSGI(plugins, flags.path_prefix),
+                             flags.path_prefix.rstrip('/') + '/metrics')
+
+def _discoverRuns(flags):
+    # Yields the (name, path) of each run which is enabled at startup
+    if flags.enable_first_N_runs < 0:
+        for path in crawl_run_paths(flags.logdir, flags.discovery_threads, flags.discovery_stop_at_runs):
+            yield os.path.relpath(path, flags.logdir), path
+    else:
+        run_path_map = _getRunPathMapFromLogdir(flags.logdir, flags.enable_first_N_runs,
+                                                flags.discovery_threads, flags.discovery_stop_at_runs,
+                                                flags.run_mtime_index)
+        for name, path in run_path_map.items():
+            yield name, path
+
+def _getRunPaths(logdir, discovery_threads, stop_at_runs):
+    # A single threaded full scan goes through the shared run index, which later requests refresh incrementally
+    if discovery_threads > 1 or stop_at_runs:
+        return list(crawl_run_paths(logdir, discovery_threads, stop_at_runs))
+    return io_helpers.get_run_paths(logdir)
+
+def _getRunMtimes(logdir, discovery_threads, stop_at_runs):
+    # The mtimes come from the discovery scan itself rather than a second pass of stats
+    if discovery_threads > 1 or stop_at_runs:
+        return crawl_run_mtimes(logdir, discovery_threads, stop_at_runs)
+    return get_run_index(logdir).run_mtimes()
+
+def _saveRunMtimeIndex(index_path, logdir, discovery_threads, stop_at_runs):
+    save_mtime_index(index_path, logdir, _getRunMtimes(logdir, discovery_threads, stop_at_runs))
+    _logger.log_message_info("Saved the run mtime index to %s" % index_path)
 
-def _getRunPathMapFromLogdir(logdir, most_recent_num):
+def _getRunPathMapFromLogdir(logdir, most_recent_num, discovery_threads=1, stop_at_runs=False, mtime_index_path=None):
     if most_recent_num == 0:
         return {}
     elif most_recent_num > 0:
-        dir_list = sorted(io_helpers.get_run_paths(logdir), key=os.path.getmtime)
-        num_files = min(most_recent_num, len(dir_list))
-        return {os.path.relpath(path, logdir): path for path in dir_list[-num_files:]}
+        index_runs = load_mtime_index(mtime_index_path, logdir) if mtime_index_path else None
+        if index_runs is not None:
+            # Select from the mtimes saved by the previous startup, and bring them up to date for the next one in the
+            # background
+            dir_list = select_most_recent_from_index(logdir, index_runs, most_recent_num)
+            thread = threading.Thread(target=_saveRunMtimeIndex, name='RunMtimeIndex',
+                                      args=(mtime_index_path, logdir, discovery_threads, stop_at_runs))
+            thread.daemon = True
+            thread.start()
+        else:
+            run_mtimes = list(_getRunMtimes(logdir, discovery_threads, stop_at_runs))
+            if mtime_index_path:
+                save_mtime_index(mtime_index_path, logdir, run_mtimes)
+            dir_list = select_most_recent(run_mtimes, most_recent_num)
+        return {os.path.relpath(path, logdir): path for path in dir_list}
     else:
-        return {os.path.relpath(path, logdir): path for path in io_helpers.get_run_paths(logdir)}
+        return {os.path.relpath(path, logdir): path for path in _getRunPaths(logdir, discovery_threads, stop_at_runs)}
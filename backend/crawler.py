@@ -0,0 +1,83 @@
+import os
+import concurrent.futures
+
+from .run_index import is_events_file
+
+def _run_mtime(path, entry):
+    # The mtime of a run from the DirEntry of its parent's listing (or a stat of the logdir itself), or None if it
+    # has vanished since it was listed
+    try:
+        return entry.stat(follow_symlinks=False).st_mtime if entry is not None else os.stat(path).st_mtime
+    except OSError:
+        return None
+
+def _scan_directory(path, entry=None, with_mtimes=False):
+    # Returns whether the directory is a run (and its mtime if asked for) along with the (path, DirEntry) of its sub
+    # directories, ignoring directories which vanish. Only the directories which turn out to be runs are stat'ed.
+    is_run = False
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for child in entries:
+                if child.is_dir(follow_symlinks=False):
+                    subdirs.append((child.path, child))
+                elif not is_run and is_events_file(child.name):
+                    is_run = True
+    except OSError:
+        pass
+    mtime = _run_mtime(path, entry) if is_run and with_mtimes else None
+    return is_run, mtime, subdirs
+
+def crawl_run_paths(logdir, num_threads=1, stop_at_runs=False):
+    """Yields the run directories under the logdir as they are found.
+
+    Each directory is listed with os.scandir on a pool of num_threads workers, so that on high latency (network)
+    filesystems many listings are in flight at once. Runs are yielded in no particular order.
+
+    Args:
+    logdir: The directory to crawl.
+    num_threads: The number of directories which may be listed concurrently.
+    stop_at_runs: If set, the sub directories of a run are not crawled (i.e. runs nested in runs are not found).
+    """
+    for path, _ in _crawl(logdir, num_threads, stop_at_runs, False):
+        yield path
+
+def crawl_run_mtimes(logdir, num_threads=1, stop_at_runs=False):
+    """Yields the (path, mtime) of each run directory under the logdir as it is found, like crawl_run_paths.
+
+    The mtime of each run comes from the DirEntry of its parent's listing, so only the runs are stat'ed and no
+    separate stat pass is needed. A run which vanishes before it can be stat'ed is not yielded, although whatever is
+    left of its sub directories is still crawled.
+    """
+    return _crawl(logdir, num_threads, stop_at_runs, True)
+
+def _crawl(logdir, num_threads, stop_at_runs, with_mtimes):
+    logdir = str(logdir)
+    if num_threads <= 1:
+        stack = [(logdir, None)]
+        while stack:
+            path, entry = stack.pop()
+            is_run, mtime, subdirs = _scan_directory(path, entry, with_mtimes)
+            if is_run and not (with_mtimes and mtime is None):
+                yield path, mtime
+            if not (is_run and stop_at_runs):
+                stack.extend(subdirs)
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_threads) as executor:
+        pending = {executor.submit(_scan_directory, logdir, None, with_mtimes): logdir}
+        try:
+            while pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    path = pending.pop(future)
+                    is_run, mtime, subdirs = future.result()
+                    if not (is_run and stop_at_runs):
+                        for subdir, entry in subdirs:
+                            pending[executor.submit(_scan_directory, subdir, entry, with_mtimes)] = subdir
+                    if is_run and not (with_mtimes and mtime is None):
+                        yield path, mtime
+        finally:
+            # the consumer may stop iterating early, in which case we abandon the rest of the crawl
+            for future in pending:
+                future.cancel()
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from gr_tensorboard.backend import crawler
+
+EVENTS_FILE = 'events.out.tfevents.1546300800.host'
+
+def _make_run(path):
+    os.makedirs(str(path), exist_ok=True)
+    (path / EVENTS_FILE).write_bytes(b'')
+
+@pytest.fixture
+def logdir(tmp_path):
+    _make_run(tmp_path / 'a')
+    _make_run(tmp_path / 'a' / 'nested')
+    _make_run(tmp_path / 'b' / 'c')
+    (tmp_path / 'b' / 'c' / 'plugins').mkdir()
+    (tmp_path / 'empty').mkdir()
+    return tmp_path
+
+def _paths(logdir, *names):
+    return sorted(str(logdir.joinpath(*name.split('/'))) for name in names)
+
+@pytest.mark.parametrize('num_threads', [1, 4])
+def test_crawl_run_paths(logdir, num_threads):
+    found = crawler.crawl_run_paths(logdir, num_threads=num_threads)
+    assert sorted(found) == _paths(logdir, 'a', 'a/nested', 'b/c')
+
+@pytest.mark.parametrize('num_threads', [1, 4])
+def test_crawl_run_paths_stop_at_runs(logdir, num_threads):
+    found = crawler.crawl_run_paths(logdir, num_threads=num_threads, stop_at_runs=True)
+    assert sorted(found) == _paths(logdir, 'a', 'b/c')
+
+@pytest.mark.parametrize('num_threads', [1, 4])
+def test_crawl_run_mtimes(logdir, num_threads):
+    os.utime(str(logdir / 'a'), (1000000000, 1000000000))
+    mtimes = dict(crawler.crawl_run_mtimes(logdir, num_threads=num_threads))
+    assert sorted(mtimes) == _paths(logdir, 'a', 'a/nested', 'b/c')
+    assert mtimes[str(logdir / 'a')] == 1000000000.0
+    assert mtimes[str(logdir / 'b' / 'c')] == os.stat(str(logdir / 'b' / 'c')).st_mtime
+
+def test_crawl_logdir_which_is_a_run(tmp_path):
+    _make_run(tmp_path)
+    assert list(crawler.crawl_run_mtimes(tmp_path)) == [(str(tmp_path), os.stat(str(tmp_path)).st_mtime)]
+
+def test_crawl_missing_logdir(tmp_path):
+    assert list(crawler.crawl_run_paths(tmp_path / 'missing')) == []
+    assert list(crawler.crawl_run_paths(tmp_path / 'missing', num_threads=4)) == []
+
+def test_vanished_run_is_skipped_but_its_subdirectories_are_crawled(logdir, monkeypatch):
+    vanished = str(logdir / 'a')
+    run_mtime = crawler._run_mtime
+    monkeypatch.setattr(crawler, '_run_mtime',
+                        lambda path, entry: None if path == vanished else run_mtime(path, entry))
+    assert sorted(path for path, _ in crawler.crawl_run_mtimes(logdir)) == _paths(logdir, 'a/nested', 'b/c')
+
+def test_stopping_early_abandons_the_crawl(logdir):
+    runs = crawler.crawl_run_paths(logdir, num_threads=4)
+    assert next(runs) in _paths(logdir, 'a', 'a/nested', 'b/c')
+    runs.close()
@@ -1,14 +1,21 @@
 import os
-import re
+
+from .run_index import get_run_index
 
 def get_run_paths(logdir):
     """
     Returns a list of runs in the logdir path - i.e. any directory which contains a tf events file
     """
-    return [root for root, _, files in os.walk(logdir) if any(re.search("events.out.tfevents.\d*.\w*", f) for f in files)]
+    return get_run_index(logdir).run_paths()
 
 def get_run_names(logdir):
     """
     Returns a list of run names in the logdir path
     """
-    return [os.path.relpath(root, logdir) for root, _, files in os.walk(logdir) if any(re.search("events.out.tfevents.\d*.\w*", f) for f in files)]
\ No newline at end of file
+    return get_run_index(logdir).run_names()
+
+def get_events_files(logdir, run):
+    """
+    Returns the paths of the tf events files within the run directory of the logdir
+    """
+    return get_run_index(logdir).events_files(os.path.join(str(logdir), run))
@@ -0,0 +1,159 @@
+import heapq
+import os
+import threading
+import time
+
+from .logging import get_logger
+
+_logger = get_logger()
+
+class LazyAccumulatorLoader:
+    """Loads the accumulators of a multiplexer in the background after the server has started.
+
+    Runs are registered with the multiplexer straight away without reading any of their events, and are loaded by a
+    pool of background threads, most recently modified first. A run which is accessed before the background threads
+    reach it is loaded on demand by the request which accessed it. Accumulators which are added to the multiplexer
+    other than through register (e.g. by runsenabler) are not managed by the loader.
+    """
+    def __init__(self, multiplexer, num_threads=1):
+        self._multiplexer = multiplexer
+        self._num_threads = max(1, num_threads)
+        # Heap of (-mtime, sequence number, name) of the runs waiting to be loaded
+        self._queue = []
+        self._sequence = 0
+        # Maps each run which has not been loaded yet to the accumulator it was registered with
+        self._pending = {}
+        # Maps each run being loaded to an event which is set once it has been loaded
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._work_available = threading.Condition(self._lock)
+        self.num_registered = 0
+        self.num_loaded = 0
+        self.num_failed = 0
+        self.discovery_done = False
+        self.start_time = time.time()
+        self.ready_time = None
+        self._threads = []
+
+    def register(self, name, path):
+        """Adds the run to the multiplexer without loading it, and queues it to be loaded"""
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            mtime = 0
+        self._multiplexer.AddRun(path, name)
+        accumulator = self._multiplexer._accumulators.get(name)
+        with self._lock:
+            self._pending[name] = accumulator
+            heapq.heappush(self._queue, (-mtime, self._sequence, name))
+            self._sequence += 1
+            self.num_registered += 1
+            self._work_available.notify()
+
+    def is_pending(self, name, accumulator):
+        """Whether the accumulator of the run is registered with the loader but has not been loaded yet"""
+        with self._lock:
+            return self._pending.get(name) is accumulator
+
+    def ensure_loaded(self, name):
+        """Loads the run now if it has not been loaded yet, or waits for it if it is being loaded"""
+        with self._lock:
+            if name not in self._pending and name not in self._loading:
+                return
+        self._load(name)
+
+    def _load(self, name):
+        with self._lock:
+            if name in self._loading:
+                done = self._loading[name]
+                owner = False
+            elif name in self._pending:
+                accumulator = self._pending[name]
+                done = self._loading[name] = threading.Event()
+                owner = True
+            else:
+                return
+        if not owner:
+            done.wait()
+            return
+
+        try:
+            accumulator.Reload()
+            failed = False
+        except Exception as e:
+            _logger.info("Unable to load accumulator '%s': %s" % (name, e))
+            failed = True
+        with self._lock:
+            # The run may have been disabled (and even enabled again with a new accumulator) while it was loading
+            if self._pending.get(name) is accumulator:
+                del self._pending[name]
+            del self._loading[name]
+            if failed:
+                self.num_failed += 1
+            else:
+                self.num_loaded += 1
+            self._update_ready()
+        done.set()
+
+    def _update_ready(self):
+        if self.ready_time is None and self.discovery_done and not self._pending:
+            self.ready_time = time.time()
+            _logger.info("Loaded %d runs in %.1f seconds" % (self.num_loaded, self.ready_time - self.start_time))
+
+    def _next(self):
+        with self._lock:
+            while True:
+                while self._queue:
+                    _, _, name = heapq.heappop(self._queue)
+                    # Skip runs which have been loaded on demand or disabled since they were queued
+                    if name in self._pending and name not in self._loading:
+                        return name
+                self._work_available.wait()
+
+    def _run(self):
+        while True:
+            self._load(self._next())
+
+    def _discover(self, discover_runs):
+        try:
+            for name, path in discover_runs():
+                self.register(name, path)
+        except Exception as e:
+            _logger.info("Discovering runs failed: %s" % e)
+        finally:
+            with self._lock:
+                self.discovery_done = True
+                self._update_ready()
+
+    def start(self, discover_runs):
+        """Starts the background threads, which register the (name, path) pairs returned by discover_runs and load them"""
+        for index in range(self._num_threads):
+            thread = threading.Thread(target=self._run, name='LazyAccumulatorLoader-%d' % index)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._discover, args=(discover_runs,), name='LazyAccumulatorDiscovery')
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def forget(self, name):
+        """Stops tracking the run, e.g. because it has been disabled"""
+        with self._lock:
+            self._pending.pop(name, None)
+            self._update_ready()
+
+    def status(self):
+        with self._lock:
+            return {
+                'lazy': True,
+                'ready': self.ready_time is not None,
+                'discovery_done': self.discovery_done,
+                'runs_registered': self.num_registered,
+                'runs_loaded': self.num_loaded,
+                'runs_failed': self.num_failed,
+                'runs_pending': len(self._pending),
+                'runs_loading': len(self._loading),
+                'seconds_since_start': time.time() - self.start_time,
+                'seconds_to_ready': None if self.ready_time is None else self.ready_time - self.start_time,
+            }
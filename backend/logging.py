@@ -2,25 +2,40 @@ import time
 import calendar
 import os
 import logging
+import threading
+
+def get_logger():
+    """Returns the grtensorboard logger, for modules which may also run without the gr backend. Its messages are
+    written to the log file once the gr backend has logged through _logger, which creates the file."""
+    return logging.getLogger('grtensorboard')
 
 class GRTensorboardLogger:
     def __init__(self):
         self.logfile_name = "grtensorboard-log-"+str(calendar.timegm(time.gmtime()))+".txt"
         self.logfile_path = os.path.join(os.getcwd(), self.logfile_name)
-        
-        # Create the logger instance which will write the profiling data
-        self.logger = logging.getLogger('grtensorboard')
-        self.logger.setLevel(logging.DEBUG)
-        file_handle = logging.FileHandler(self.logfile_path)
-        file_handle.setLevel(logging.DEBUG)
-        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        file_handle.setFormatter(formatter)
-        self.logger.addHandler(file_handle)
+        self.logger = get_logger()
+        self._file_handle = None
+        self._file_handle_lock = threading.Lock()
+
+    def _ensure_file_handle(self):
+        # The log file is only created on first use, so that importing this module for get_logger does not create it
+        with self._file_handle_lock:
+            if self._file_handle is not None:
+                return
+            # Create the logger instance which will write the profiling data
+            self.logger.setLevel(logging.DEBUG)
+            self._file_handle = logging.FileHandler(self.logfile_path)
+            self._file_handle.setLevel(logging.DEBUG)
+            formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+            self._file_handle.setFormatter(formatter)
+            self.logger.addHandler(self._file_handle)
     
     def log_message_info(self, message):
+        self._ensure_file_handle()
         self.logger.info(message)
     
     def log_message_debug(self, message):
+        self._ensure_file_handle()
         self.logger.debug(message)
 
 
@@ -0,0 +1,204 @@
+import math
+import threading
+import time
+
+# The content type of the Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds (in seconds) of the latency histogram buckets, from a fast json route to a slow bulk operation
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_value(value):
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value))
+
+def _format_labels(label_names, label_values):
+    if not label_names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in label_values)
+    return '{' + ','.join('%s="%s"' % (name, value) for name, value in zip(label_names, escaped)) + '}'
+
+class _Metric:
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError("Expected the labels %s for %s but got %s" % (self.label_names, self.name, sorted(labels)))
+        return tuple(labels[name] for name in self.label_names)
+
+    def _header(self):
+        return ['# HELP %s %s' % (self.name, self.description), '# TYPE %s %s' % (self.name, self.type)]
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = self._header()
+        for key, value in values:
+            lines.append('%s%s %s' % (self.name, _format_labels(self.label_names, key), _format_value(value)))
+        return lines
+
+class Counter(_Metric):
+    """A count which only goes up, e.g. of the runs enabled since startup"""
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """A value which goes up and down, e.g. the number of enabled runs"""
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    """The distribution of observed values (e.g. latencies) over fixed buckets, along with their count and sum"""
+    type = 'histogram'
+
+    def __init__(self, name, description, label_names=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super(Histogram, self).__init__(name, description, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # The count of each bucket followed by the overall count and sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def render(self):
+        with self._lock:
+            values = sorted((key, list(counts)) for key, counts in self._values.items())
+        lines = self._header()
+        bucket_label_names = self.label_names + ('le',)
+        for key, counts in values:
+            for bound, count in zip(self.buckets + (math.inf,), counts[:-2] + [counts[-2]]):
+                lines.append('%s_bucket%s %d' % (self.name, _format_labels(bucket_label_names, key + (_format_value(bound),)), count))
+            labels = _format_labels(self.label_names, key)
+            lines.append('%s_count%s %d' % (self.name, labels, counts[-2]))
+            lines.append('%s_sum%s %s' % (self.name, labels, _format_value(counts[-1])))
+        return lines
+
+class CallbackMetric(_Metric):
+    """A counter or gauge whose value is read when the metrics are rendered, for values which are already kept
+    elsewhere (e.g. the hit counts of a cache). The callback returns either a value, or a dictionary mapping tuples
+    of label values to values."""
+    def __init__(self, name, description, type, callback, label_names=()):
+        super(CallbackMetric, self).__init__(name, description, label_names)
+        self.type = type
+        self.callback = callback
+
+    def render(self):
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines = self._header()
+        for key, value in sorted(values.items()):
+            lines.append('%s%s %s' % (self.name, _format_labels(self.label_names, key), _format_value(value)))
+        return lines
+
+class MetricsRegistry:
+    """The metrics of the process, rendered in the Prometheus text format.
+
+    Metrics are created on first use and shared by name afterwards, so a plugin which is instantiated more than once
+    keeps adding to the same metrics. Registering a callback metric again replaces its callback.
+    """
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError("Metric %s is already registered as a %s" % (name, metric.type))
+            return metric
+
+    def counter(self, name, description, label_names=()):
+        return self._get_or_create(Counter, name, description, label_names)
+
+    def gauge(self, name, description, label_names=()):
+        return self._get_or_create(Gauge, name, description, label_names)
+
+    def histogram(self, name, description, label_names=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, description, label_names, buckets)
+
+    def callback(self, name, description, type, callback, label_names=()):
+        with self._lock:
+            metric = self._metrics[name] = CallbackMetric(name, description, type, callback, label_names)
+            return metric
+
+    def render(self):
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+_registry = MetricsRegistry()
+
+def get_metrics():
+    """Returns the process wide metrics registry, which is shared by every plugin and the backend"""
+    return _registry
+
+def instrument_route(plugin_name, route, app):
+    """Wraps the wsgi app of a plugin route so that its latency and response codes are recorded.
+
+    The latency is measured until the app has returned its response, so the time taken to send a streamed body to
+    the client is not included.
+    """
+    registry = get_metrics()
+    latency = registry.histogram('grtensorboard_route_latency_seconds', 'The time taken to handle requests to each route',
+                                 ('plugin', 'route'))
+    requests = registry.counter('grtensorboard_route_requests_total', 'The requests handled by each route by response code',
+                                ('plugin', 'route', 'code'))
+    def instrumented(environ, start_response):
+        codes = []
+        def recording_start_response(status, headers, exc_info=None):
+            codes.append(status.split(' ', 1)[0])
+            return start_response(status, headers, exc_info)
+        start = time.time()
+        try:
+            return app(environ, recording_start_response)
+        finally:
+            latency.observe(time.time() - start, plugin=plugin_name, route=route)
+            requests.inc(plugin=plugin_name, route=route, code=codes[0] if codes else '500')
+    return instrumented
+
+def instrument_routes(plugin_name, apps):
+    """Instruments every route of a plugin's get_plugin_apps dictionary"""
+    return {route: instrument_route(plugin_name, route, app) for route, app in apps.items()}
+
+class MetricsMiddleware:
+    """Serves the metrics at path (e.g. /metrics) in front of a wsgi app, where a Prometheus server expects them"""
+    def __init__(self, app, path='/metrics'):
+        self._app = app
+        self._path = path
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') != self._path:
+            return self._app(environ, start_response)
+        body = get_metrics().render().encode('utf-8')
+        start_response('200 OK', [('Content-Type', CONTENT_TYPE), ('Content-Length', str(len(body)))])
+        return [body]
@@ -29,6 +29,9 @@ class GRTensorBoard(program.TensorBoard):
       return 0
     try:
       server = self._make_server()
+      # Exit through SystemExit on SIGTERM (e.g. from a process manager) so that the caller's finally blocks still run,
+      # such as main.py saving the warm restart workspace and accumulator snapshots
+      self._install_signal_handler(signal.SIGTERM, 'SIGTERM')
       sys.stderr.write('GRTensorBoard %s at %s (Press CTRL+C to quit)\n' %
                        (VERSION, server.get_url()))
       sys.stderr.flush()
@@ -60,10 +63,20 @@ class GRTensorBoard(program.TensorBoard):
     return server.get_url()
 
   def _register_info(self, server):
-    self._register_info(server)
+    super(GRTensorBoard, self)._register_info(server)
   
   def _install_signal_handler(self, signal_number, signal_name):
-    self._install_signal_handler(signal_number, signal_name)
+    """Makes the signal raise SystemExit in the main thread after calling any handler it already had"""
+    old_signal_handler = None
+    def handler(handled_signal_number, frame):
+      # A second signal gets the default behaviour, in case exiting cleanly hangs
+      signal.signal(signal_number, signal.SIG_DFL)
+      sys.stderr.write('GRTensorBoard caught %s; exiting...\n' % signal_name)
+      _logger.log_message_info('Caught %s, exiting' % signal_name)
+      if old_signal_handler not in (signal.SIG_IGN, signal.SIG_DFL, None):
+        old_signal_handler(handled_signal_number, frame)
+      sys.exit(0)
+    old_signal_handler = signal.signal(signal_number, handler)
   
   def _make_server(self):
     app = gr_tensorboard_wsgi(self.flags, self.plugin_loaders, self.assets_zip_provider)
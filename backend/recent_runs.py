@@ -0,0 +1,73 @@
+import heapq
+import json
+import os
+import tempfile
+
+from .logging import get_logger
+
+_logger = get_logger()
+
+def select_most_recent(run_mtimes, num_runs):
+    """Returns the paths of the num_runs most recently modified runs, oldest first.
+
+    Only a heap of num_runs runs is kept while consuming run_mtimes, so selecting from R runs takes O(R log N) rather
+    than sorting all of them.
+
+    Args:
+    run_mtimes: An iterable of the (path, mtime) of each run.
+    num_runs: The number of runs to select.
+    """
+    heap = []
+    for index, (path, mtime) in enumerate(run_mtimes):
+        # The index breaks ties between equal mtimes without comparing paths
+        item = (mtime, -index, path)
+        if len(heap) < num_runs:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+    return [path for _, _, path in sorted(heap)]
+
+def load_mtime_index(index_path, logdir):
+    """Loads the run mtimes saved by save_mtime_index for the logdir, returning None if there are none"""
+    try:
+        with open(index_path, 'r') as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return None
+    if index.get('logdir') != str(logdir):
+        return None
+    return index.get('runs')
+
+def save_mtime_index(index_path, logdir, run_mtimes):
+    """Saves the mtime of each run (relative to the logdir) so that the next startup can select the most recent runs
+    without crawling the logdir. The file is replaced atomically."""
+    runs = {os.path.relpath(path, str(logdir)): mtime for path, mtime in run_mtimes}
+    directory = os.path.dirname(os.path.abspath(index_path))
+    try:
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as index_file:
+            json.dump({'logdir': str(logdir), 'runs': runs}, index_file, separators=(',', ':'))
+        os.replace(index_file.name, index_path)
+    except OSError as e:
+        _logger.info("Unable to save the run mtime index to %s: %s" % (index_path, e))
+
+def select_most_recent_from_index(logdir, index_runs, num_runs):
+    """Selects the num_runs most recently modified runs using the mtimes saved by a previous startup.
+
+    The saved runs are visited from most to least recently modified, and each is stat'ed to check it still exists,
+    until num_runs runs have been found - so this costs O(num_runs) stats unless many of the runs have been deleted.
+    Runs which have been created since the index was saved are not seen until the index is next saved.
+    """
+    selected = []
+    # Heapify is linear, and each run visited costs only a pop, so the saved runs are never fully sorted
+    heap = [(-mtime, name) for name, mtime in index_runs.items()]
+    heapq.heapify(heap)
+    while heap:
+        _, name = heapq.heappop(heap)
+        path = os.path.join(str(logdir), name)
+        try:
+            selected.append((path, os.stat(path).st_mtime))
+        except OSError:
+            continue
+        if len(selected) == num_runs:
+            break
+    return select_most_recent(selected, num_runs)
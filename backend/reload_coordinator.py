@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+
+from .logging import get_logger
+from .metrics import get_metrics
+from .run_index import is_events_file
+
+_logger = get_logger()
+
+_reload_duration = get_metrics().histogram('grtensorboard_reload_duration_seconds',
+                                           'The time taken by each reload of the multiplexer')
+_accumulators_reloaded = get_metrics().counter('grtensorboard_accumulators_reloaded_total',
+                                               'The accumulators reloaded because their events files changed')
+
+class ReloadCoordinator:
+    """Reloads the accumulators of an EventMultiplexer on behalf of every plugin.
+
+    Reloads happen on a background thread every reload interval (or sooner when a plugin triggers one) and only
+    accumulators whose events files have changed size or mtime since their last reload are reloaded. Concurrent
+    requests for a reload are deduplicated so that at most one reload is ever in flight, and requests are served
+    from the state of the accumulators as of the last completed reload. The gr backend does not start the stock reload
+    thread, so this is the only thing reloading the multiplexer.
+    """
+    def __init__(self, multiplexer, interval):
+        self._multiplexer = multiplexer
+        self.interval = interval
+        # Maps each run to its accumulator and the (name, size, mtime) of the accumulator's events files when it was last
+        # reloaded - the accumulator is kept so that a run which is disabled and enabled again is always reloaded
+        self._signatures = {}
+        self.last_reload_time = None
+        self.last_reload_duration = None
+        self._reload_lock = threading.Lock()
+        self._generation = 0
+        self._condition = threading.Condition()
+        self._wake_event = threading.Event()
+        self._thread = None
+
+    def _signature(self, path):
+        try:
+            signature = []
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if is_events_file(entry.name):
+                        stat = entry.stat()
+                        signature.append((entry.name, stat.st_size, stat.st_mtime_ns))
+            return tuple(sorted(signature))
+        except OSError:
+            return None
+
+    def _reload(self):
+        start = time.time()
+        with self._multiplexer._accumulators_mutex:
+            accumulators = dict(self._multiplexer._accumulators)
+        names_to_delete = []
+        reloaded = 0
+        lazy_loader = getattr(self._multiplexer, 'lazy_loader', None)
+        for name, accumulator in accumulators.items():
+            if lazy_loader is not None and lazy_loader.is_pending(name, accumulator):
+                # Left to the lazy loader, which loads the most recently modified runs first
+                continue
+            path = self._multiplexer._paths.get(name)
+            signature = self._signature(path) if path is not None else None
+            if signature is not None and self._signatures.get(name) == (accumulator, signature):
+                continue
+            try:
+                accumulator.Reload()
+                reloaded += 1
+            except Exception as e:
+                # Mirror EventMultiplexer.Reload, which drops runs whose directories can no longer be read
+                _logger.info("Unable to reload accumulator '%s': %s" % (name, e))
+                names_to_delete.append(name)
+                continue
+            self._signatures[name] = (accumulator, signature)
+
+        with self._multiplexer._accumulators_mutex:
+            for name in names_to_delete:
+                # Only delete the accumulator we failed to reload, not one which has since been enabled in its place
+                if self._multiplexer._accumulators.get(name) is accumulators[name]:
+                    del self._multiplexer._accumulators[name]
+        # Forget the signatures of runs which have been disabled so that they are reloaded if they are enabled again
+        current = set(self._multiplexer._accumulators)
+        for name in list(self._signatures):
+            if name not in current:
+                del self._signatures[name]
+
+        self.last_reload_time = time.time()
+        self.last_reload_duration = self.last_reload_time - start
+        _reload_duration.observe(self.last_reload_duration)
+        _accumulators_reloaded.inc(reloaded)
+        return reloaded
+
+    def reload(self):
+        """Reloads the changed accumulators. If a reload is already in flight this waits for it rather than starting another."""
+        with self._condition:
+            generation = self._generation
+        if not self._reload_lock.acquire(blocking=False):
+            # Someone else is reloading - wait until their reload has completed
+            with self._condition:
+                while self._generation == generation:
+                    self._condition.wait()
+            return
+        try:
+            self._reload()
+        finally:
+            self._reload_lock.release()
+            with self._condition:
+                self._generation += 1
+                self._condition.notify_all()
+
+    def trigger(self):
+        """Asks the background thread to reload as soon as possible, or reloads now if there is no background thread"""
+        if self._thread is None:
+            self.reload()
+        else:
+            self._wake_event.set()
+
+    def request_snapshot(self):
+        """Called by routes before reading from the multiplexer. With a background schedule the routes are served from the
+        last completed reload, otherwise this reloads (deduplicated with any concurrent requests)."""
+        if self._thread is None:
+            self.reload()
+
+    @property
+    def snapshot_age(self):
+        """The number of seconds since the last completed reload, or None if there has not been one"""
+        if self.last_reload_time is None:
+            return None
+        return time.time() - self.last_reload_time
+
+    def add_snapshot_age_header(self, response):
+        age = self.snapshot_age
+        if age is not None:
+            response.headers['X-Reload-Snapshot-Age'] = '%.3f' % age
+        return response
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name='ReloadCoordinator')
+            self._thread.daemon = True
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            self._wake_event.wait(self.interval)
+            self._wake_event.clear()
+            try:
+                self.reload()
+            except Exception as e:
+                _logger.info("Reloading the multiplexer failed: %s" % e)
+
+_coordinators = {}
+_coordinators_lock = threading.Lock()
+
+def get_reload_coordinator(multiplexer, interval):
+    """Returns the (started) reload coordinator of the multiplexer, which is shared by every plugin"""
+    with _coordinators_lock:
+        if id(multiplexer) not in _coordinators:
+            _coordinators[id(multiplexer)] = ReloadCoordinator(multiplexer, interval).start()
+        return _coordinators[id(multiplexer)]
@@ -0,0 +1,128 @@
+import os
+import re
+import threading
+import time
+
+# Matches the tensorflow events files which mark a directory as a run
+EVENTS_FILE_PATTERN = re.compile(r"events.out.tfevents.\d*.\w*")
+
+# Directories modified this recently may still be changing within the resolution of the filesystem's mtime,
+# so their listing is never trusted on the next refresh
+_MTIME_SETTLE_SECONDS = 2.0
+
+def is_events_file(name):
+    return EVENTS_FILE_PATTERN.search(name) is not None
+
+class _DirectoryEntry:
+    __slots__ = ('mtime', 'events_files', 'subdirs', 'stat_mtime')
+
+    def __init__(self, mtime, events_files, subdirs):
+        self.mtime = mtime
+        self.events_files = events_files
+        self.subdirs = subdirs
+        # The mtime (in seconds) of the directory when it was last stat'ed, even when mtime is cleared to force a rescan
+        self.stat_mtime = None
+
+class RunDiscoveryIndex:
+    """An incrementally refreshed index of the runs (directories containing an events file) under a logdir.
+
+    The index remembers the mtime of every directory in the tree along with its events files and sub directories.
+    A refresh stats each known directory and only lists those whose mtime has changed, so the cost of a refresh
+    on an unchanged tree is one stat per directory rather than a listing and a regex match for every file.
+    """
+    def __init__(self, logdir):
+        self.logdir = str(logdir)
+        self._entries = {}
+        self._run_paths = []
+        self._lock = threading.Lock()
+
+    def _scan_directory(self, path, mtime):
+        events_files = []
+        subdirs = []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                # mirror os.walk, which does not descend into symlinked directories
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif is_events_file(entry.name):
+                    events_files.append(entry.name)
+        return _DirectoryEntry(mtime, events_files, subdirs)
+
+    def refresh(self):
+        """Brings the index up to date with the logdir, rescanning only the directories whose mtime has changed"""
+        with self._lock:
+            settle_time = time.time() - _MTIME_SETTLE_SECONDS
+            visited = set()
+            run_paths = []
+            stack = [self.logdir]
+            while stack:
+                path = stack.pop()
+                try:
+                    stat = os.stat(path)
+                    entry = self._entries.get(path)
+                    if entry is None or entry.mtime != stat.st_mtime_ns:
+                        entry = self._scan_directory(path, stat.st_mtime_ns)
+                        if stat.st_mtime >= settle_time:
+                            # Force a rescan next time in case the directory changes again within the same mtime tick
+                            entry.mtime = None
+                        self._entries[path] = entry
+                    entry.stat_mtime = stat.st_mtime
+                except OSError:
+                    # the directory was removed (or is unreadable) so drop it from the index
+                    continue
+                visited.add(path)
+                if entry.events_files:
+                    run_paths.append(path)
+                # push in reverse so that directories are visited in listing order
+                stack.extend(reversed(entry.subdirs))
+
+            for path in set(self._entries).difference(visited):
+                del self._entries[path]
+            self._run_paths = run_paths
+
+    def run_paths(self, refresh=True):
+        """Returns a list of the run directories under the logdir"""
+        if refresh:
+            self.refresh()
+        return list(self._run_paths)
+
+    def run_mtimes(self, refresh=True):
+        """Returns a list of the (path, mtime) of the run directories under the logdir, using the mtimes from the refresh"""
+        if refresh:
+            self.refresh()
+        with self._lock:
+            return [(path, self._entries[path].stat_mtime) for path in self._run_paths]
+
+    def run_names(self, refresh=True):
+        """Returns a list of the run names (run directories relative to the logdir)"""
+        return [os.path.relpath(path, self.logdir) for path in self.run_paths(refresh)]
+
+    def events_files(self, run_path):
+        """Returns the paths of the events files found in the run directory on the last refresh"""
+        run_path = str(run_path)
+        entry = self._entries.get(run_path)
+        if entry is None:
+            # the run has not been indexed yet so list it directly rather than refreshing the whole tree
+            try:
+                entry = self._scan_directory(run_path, None)
+            except OSError:
+                return []
+        return [os.path.join(run_path, name) for name in entry.events_files]
+
+    def directories(self):
+        """Returns the paths of every directory found on the last refresh"""
+        return list(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+_indices = {}
+_indices_lock = threading.Lock()
+
+def get_run_index(logdir):
+    """Returns the run discovery index for the logdir, which is shared by every caller in the process"""
+    logdir = str(logdir)
+    with _indices_lock:
+        if logdir not in _indices:
+            _indices[logdir] = RunDiscoveryIndex(logdir)
+        return _indices[logdir]
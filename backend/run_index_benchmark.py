@@ -0,0 +1,92 @@
+"""Benchmarks run discovery with the RunDiscoveryIndex against a full os.walk over synthetic logdirs
+
+Usage: python -m gr_tensorboard.backend.run_index_benchmark --sizes 10000 100000 1000000
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import os
+import re
+import shutil
+import tempfile
+import time
+
+from .run_index import RunDiscoveryIndex, _MTIME_SETTLE_SECONDS
+
+# Number of run directories placed under each group directory of the synthetic logdir
+RUNS_PER_GROUP = 100
+
+
+def walk_run_paths(logdir):
+    """The original discovery implementation: a full walk with a regex over every file name"""
+    return [root for root, _, files in os.walk(logdir) if any(re.search(r"events.out.tfevents.\d*.\w*", f) for f in files)]
+
+
+def create_synthetic_logdir(logdir, num_dirs):
+    """Creates num_dirs directories under logdir, half of which are runs containing an (empty) events file"""
+    created = 0
+    group = 0
+    while created < num_dirs:
+        group_path = os.path.join(logdir, "group%d" % group)
+        os.mkdir(group_path)
+        created += 1
+        for run in range(min(RUNS_PER_GROUP, num_dirs - created)):
+            run_path = os.path.join(group_path, "run%d" % run)
+            os.mkdir(run_path)
+            created += 1
+            open(os.path.join(run_path, "runparams.json"), 'w').close()
+            if run % 2 == 0:
+                open(os.path.join(run_path, "events.out.tfevents.%d.host" % run), 'w').close()
+        group += 1
+
+
+def time_call(func):
+    start = time.time()
+    result = func()
+    return time.time() - start, result
+
+
+def benchmark(num_dirs):
+    logdir = tempfile.mkdtemp(prefix="run_index_benchmark")
+    try:
+        print("creating synthetic logdir with %d directories in %s" % (num_dirs, logdir))
+        create_synthetic_logdir(logdir, num_dirs)
+        # let the directory mtimes settle so that the index is allowed to trust them
+        time.sleep(_MTIME_SETTLE_SECONDS)
+        index = RunDiscoveryIndex(logdir)
+
+        walk_time, walk_runs = time_call(lambda: walk_run_paths(logdir))
+        cold_time, cold_runs = time_call(index.run_paths)
+        assert sorted(walk_runs) == sorted(cold_runs)
+        warm_time, _ = time_call(index.run_paths)
+
+        # add a single new run and measure the refresh which picks it up
+        new_run_path = os.path.join(logdir, "group0", "new_run")
+        os.mkdir(new_run_path)
+        open(os.path.join(new_run_path, "events.out.tfevents.0.host"), 'w').close()
+        changed_time, changed_runs = time_call(index.run_paths)
+        assert new_run_path in changed_runs
+
+        print("  %d runs found" % len(walk_runs))
+        print("  os.walk:                 %.3fs" % walk_time)
+        print("  index (cold):            %.3fs" % cold_time)
+        print("  index (warm, unchanged): %.3fs" % warm_time)
+        print("  index (warm, one added): %.3fs" % changed_time)
+    finally:
+        shutil.rmtree(logdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='number of directories in each synthetic logdir')
+    args = parser.parse_args()
+    for num_dirs in args.sizes:
+        benchmark(num_dirs)
+
+
+if __name__ == '__main__':
+    main()
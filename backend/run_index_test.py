@@ -0,0 +1,81 @@
+import os
+
+from gr_tensorboard.backend import run_index
+
+EVENTS_FILE = 'events.out.tfevents.1546300800.host'
+
+def _make_run(path):
+    os.makedirs(str(path), exist_ok=True)
+    (path / EVENTS_FILE).write_bytes(b'')
+
+def test_is_events_file():
+    assert run_index.is_events_file(EVENTS_FILE)
+    assert run_index.is_events_file('events.out.tfevents.1546300800.host.profile-empty')
+    assert not run_index.is_events_file('runparams.json')
+
+def test_run_paths_finds_nested_runs(tmp_path):
+    _make_run(tmp_path / 'a')
+    _make_run(tmp_path / 'a' / 'nested')
+    _make_run(tmp_path / 'b' / 'c')
+    (tmp_path / 'empty').mkdir()
+
+    index = run_index.RunDiscoveryIndex(tmp_path)
+    assert sorted(index.run_names()) == ['a', os.path.join('a', 'nested'), os.path.join('b', 'c')]
+    assert len(index) == 6
+
+def test_refresh_finds_added_and_removed_runs(tmp_path):
+    _make_run(tmp_path / 'a')
+    index = run_index.RunDiscoveryIndex(tmp_path)
+    assert index.run_names() == ['a']
+
+    _make_run(tmp_path / 'b')
+    assert sorted(index.run_names()) == ['a', 'b']
+
+    os.remove(str(tmp_path / 'a' / EVENTS_FILE))
+    os.rmdir(str(tmp_path / 'a'))
+    assert index.run_names() == ['b']
+    assert str(tmp_path / 'a') not in index.directories()
+
+def test_run_paths_without_refresh_uses_the_last_refresh(tmp_path):
+    index = run_index.RunDiscoveryIndex(tmp_path)
+    assert index.run_paths() == []
+    _make_run(tmp_path / 'a')
+    assert index.run_paths(refresh=False) == []
+    assert index.run_paths() == [str(tmp_path / 'a')]
+
+def test_unchanged_directories_are_not_listed_again(tmp_path, monkeypatch):
+    _make_run(tmp_path / 'a')
+    index = run_index.RunDiscoveryIndex(tmp_path)
+    # pretend the tree settled long ago so that its listings are trusted on the next refresh
+    monkeypatch.setattr(run_index, '_MTIME_SETTLE_SECONDS', -3600.0)
+    index.refresh()
+
+    scanned = []
+    scan_directory = index._scan_directory
+    def _record_scan(path, mtime):
+        scanned.append(path)
+        return scan_directory(path, mtime)
+    monkeypatch.setattr(index, '_scan_directory', _record_scan)
+    assert index.run_names() == ['a']
+    assert scanned == []
+
+def test_run_mtimes(tmp_path):
+    _make_run(tmp_path / 'a')
+    os.utime(str(tmp_path / 'a'), (1000000000, 1000000000))
+    index = run_index.RunDiscoveryIndex(tmp_path)
+    assert index.run_mtimes() == [(str(tmp_path / 'a'), 1000000000.0)]
+
+def test_events_files(tmp_path):
+    _make_run(tmp_path / 'a')
+    (tmp_path / 'a' / 'runparams.json').write_text('{}')
+    index = run_index.RunDiscoveryIndex(tmp_path)
+    expected = [os.path.join(str(tmp_path / 'a'), EVENTS_FILE)]
+    # listed directly before the first refresh, then from the index
+    assert index.events_files(tmp_path / 'a') == expected
+    index.refresh()
+    assert index.events_files(tmp_path / 'a') == expected
+    assert index.events_files(tmp_path / 'missing') == []
+
+def test_get_run_index_is_shared(tmp_path):
+    assert run_index.get_run_index(tmp_path) is run_index.get_run_index(str(tmp_path))
+    assert run_index.get_run_index(tmp_path) is not run_index.get_run_index(tmp_path / 'other')
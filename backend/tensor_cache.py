@@ -0,0 +1,154 @@
+import collections
+import threading
+
+import numpy as np
+
+from .metrics import get_metrics
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+class _Entry:
+    __slots__ = ('signature', 'first', 'value', 'num_bytes')
+
+    def __init__(self, signature, first, value, num_bytes):
+        self.signature = signature
+        # The (step, wall_time) of the first event, which together with the signature identifies a prefix of the events
+        self.first = first
+        self.value = value
+        self.num_bytes = num_bytes
+
+def _event_key(event):
+    return (event.step, event.wall_time)
+
+def _signature(tensor_events):
+    # A full reservoir keeps the same number of events while replacing them, so the most recent event is part of the key
+    if not tensor_events:
+        return (0, None)
+    return (len(tensor_events),) + _event_key(tensor_events[-1])
+
+def _extends(entry, tensor_events):
+    # Whether tensor_events are the events of the entry followed by new ones, as they are while a reservoir which is
+    # not yet full has events appended to it. A full reservoir keeps the same number of events, so never extends
+    num_events = entry.signature[0]
+    return (0 < num_events < len(tensor_events)
+            and _event_key(tensor_events[0]) == entry.first
+            and _event_key(tensor_events[num_events - 1]) == entry.signature[1:])
+
+def _concatenate(value, appended):
+    if isinstance(value, tuple):
+        return tuple(np.concatenate([item, appended_item]) for item, appended_item in zip(value, appended))
+    return np.concatenate([value, appended])
+
+def _num_bytes(value):
+    # Decoded series are NumPy arrays or tuples of them
+    if isinstance(value, (tuple, list)):
+        return sum(_num_bytes(item) for item in value)
+    return getattr(value, 'nbytes', 0)
+
+class DecodedTensorCache:
+    """A process wide LRU cache of decoded tensor series, shared by every plugin and bounded by a byte budget.
+
+    Series are keyed by run and tag. An entry is used as is while the number of events and the most recent event are
+    unchanged, and when events have only been appended since it was decoded just the new events are decoded and
+    appended to it - so a run which is still being written costs one decode of each of its events rather than one
+    decode of all of its events every time it grows. Decoded series must be NumPy arrays (or tuples of them) with one
+    element per event. The entries of a run are evicted when runsenabler disables it.
+    """
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.num_bytes = 0
+        self.hits = 0
+        self.appends = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, run, tag, tensor_events, decode):
+        """Returns the decoded tensor events of the run and tag, calling decode on the events which are not cached"""
+        key = (run, tag)
+        signature = _signature(tensor_events)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.signature == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            if entry is not None and _extends(entry, tensor_events):
+                self.appends += 1
+            else:
+                entry = None
+                self.misses += 1
+
+        # Decode outside the lock so that other series can be served meanwhile
+        if entry is not None:
+            value = _concatenate(entry.value, decode(tensor_events[entry.signature[0]:]))
+        else:
+            value = decode(tensor_events)
+        num_bytes = _num_bytes(value)
+        if num_bytes > self.max_bytes:
+            return value
+        first = _event_key(tensor_events[0]) if tensor_events else None
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = _Entry(signature, first, value, num_bytes)
+            self.num_bytes += num_bytes
+            while self.num_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.num_bytes -= evicted.num_bytes
+                self.evictions += 1
+        return value
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.num_bytes -= entry.num_bytes
+        return entry
+
+    def evict_run(self, run):
+        """Evicts every series of the run, e.g. because it has been disabled"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == run]:
+                self._remove(key)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.num_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'appends': self.appends,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+_tensor_cache = None
+_tensor_cache_lock = threading.Lock()
+
+def _register_metrics(cache):
+    # The hit rate is rate(hits) / (rate(hits) + rate(misses))
+    registry = get_metrics()
+    registry.callback('grtensorboard_tensor_cache_hits_total', 'Lookups served by the decoded tensor cache',
+                      'counter', lambda: cache.hits)
+    registry.callback('grtensorboard_tensor_cache_appends_total',
+                      'Lookups which only had to decode the events appended since the series was cached',
+                      'counter', lambda: cache.appends)
+    registry.callback('grtensorboard_tensor_cache_misses_total', 'Lookups which had to decode every tensor event',
+                      'counter', lambda: cache.misses)
+    registry.callback('grtensorboard_tensor_cache_evictions_total', 'Series evicted from the decoded tensor cache',
+                      'counter', lambda: cache.evictions)
+    registry.callback('grtensorboard_tensor_cache_bytes', 'The bytes of decoded series in the cache',
+                      'gauge', lambda: cache.num_bytes)
+
+def get_tensor_cache(max_bytes=None):
+    """Returns the process wide decoded tensor cache, creating it with max_bytes (or resizing it to max_bytes) if given"""
+    global _tensor_cache
+    with _tensor_cache_lock:
+        if _tensor_cache is None:
+            _tensor_cache = DecodedTensorCache(DEFAULT_MAX_BYTES if max_bytes is None else max_bytes)
+            _register_metrics(_tensor_cache)
+        elif max_bytes is not None:
+            _tensor_cache.max_bytes = max_bytes
+        return _tensor_cache
@@ -0,0 +1,103 @@
+import collections
+
+import numpy as np
+
+from gr_tensorboard.backend.tensor_cache import DecodedTensorCache
+
+TensorEvent = collections.namedtuple('TensorEvent', ['wall_time', 'step', 'value'])
+
+def _events(steps):
+    return [TensorEvent(wall_time=1000.0 + step, step=step, value=float(step)) for step in steps]
+
+class _Decoder:
+    """Decodes the value of each event into a float64 array, remembering how many events it was asked to decode"""
+    def __init__(self):
+        self.decoded = []
+
+    def __call__(self, tensor_events):
+        self.decoded.append(len(tensor_events))
+        return np.array([event.value for event in tensor_events], dtype=np.float64)
+
+def _stats(cache, *names):
+    stats = cache.stats()
+    return tuple(stats[name] for name in names)
+
+def test_hit():
+    cache = DecodedTensorCache()
+    decode = _Decoder()
+    events = _events(range(4))
+    first = cache.get('run', 'tag', events, decode)
+    assert cache.get('run', 'tag', list(events), decode) is first
+    np.testing.assert_array_equal(first, [0.0, 1.0, 2.0, 3.0])
+    assert decode.decoded == [4]
+    assert _stats(cache, 'entries', 'bytes', 'hits', 'misses') == (1, 32, 1, 1)
+
+def test_appended_events_are_decoded_alone():
+    cache = DecodedTensorCache()
+    decode = _Decoder()
+    cache.get('run', 'tag', _events(range(4)), decode)
+    value = cache.get('run', 'tag', _events(range(6)), decode)
+    np.testing.assert_array_equal(value, np.arange(6))
+    assert decode.decoded == [4, 2]
+    assert _stats(cache, 'bytes', 'appends', 'misses') == (48, 1, 1)
+
+def test_tuple_values_are_appended():
+    cache = DecodedTensorCache()
+    decode = lambda tensor_events: (np.array([event.step for event in tensor_events]),
+                                    np.array([event.value for event in tensor_events]))
+    cache.get('run', 'tag', _events(range(2)), decode)
+    steps, values = cache.get('run', 'tag', _events(range(3)), decode)
+    np.testing.assert_array_equal(steps, [0, 1, 2])
+    np.testing.assert_array_equal(values, [0.0, 1.0, 2.0])
+    assert _stats(cache, 'appends') == (1,)
+
+def test_replaced_events_are_decoded_again():
+    cache = DecodedTensorCache()
+    decode = _Decoder()
+    cache.get('run', 'tag', _events(range(4)), decode)
+    # a full reservoir keeps the same number of events while replacing them
+    cache.get('run', 'tag', _events([0, 1, 2, 5]), decode)
+    # a reservoir which drops an earlier event while growing does not extend the cached events
+    value = cache.get('run', 'tag', _events([0, 2, 5, 6, 7]), decode)
+    np.testing.assert_array_equal(value, [0.0, 2.0, 5.0, 6.0, 7.0])
+    assert decode.decoded == [4, 4, 5]
+    assert _stats(cache, 'hits', 'appends', 'misses') == (0, 0, 3)
+
+def test_empty_events():
+    cache = DecodedTensorCache()
+    decode = _Decoder()
+    cache.get('run', 'tag', [], decode)
+    cache.get('run', 'tag', [], decode)
+    value = cache.get('run', 'tag', _events(range(2)), decode)
+    np.testing.assert_array_equal(value, [0.0, 1.0])
+    assert decode.decoded == [0, 2]
+
+def test_least_recently_used_series_are_evicted():
+    cache = DecodedTensorCache(max_bytes=64)
+    decode = _Decoder()
+    for tag in ('a', 'b', 'c'):
+        cache.get('run', tag, _events(range(3)), decode)
+    # 'a' was evicted to make room for 'c', and using 'b' makes 'c' the least recently used
+    cache.get('run', 'b', _events(range(3)), decode)
+    cache.get('run', 'a', _events(range(3)), decode)
+    assert _stats(cache, 'entries', 'bytes', 'hits', 'misses', 'evictions') == (2, 48, 1, 4, 2)
+    cache.get('run', 'b', _events(range(3)), decode)
+    assert _stats(cache, 'hits') == (2,)
+
+def test_series_larger_than_the_cache_are_not_cached():
+    cache = DecodedTensorCache(max_bytes=16)
+    decode = _Decoder()
+    value = cache.get('run', 'tag', _events(range(3)), decode)
+    np.testing.assert_array_equal(value, [0.0, 1.0, 2.0])
+    assert _stats(cache, 'entries', 'bytes', 'evictions') == (0, 0, 0)
+
+def test_evict_run():
+    cache = DecodedTensorCache()
+    decode = _Decoder()
+    for run, tag in [('run0', 'a'), ('run0', 'b'), ('run1', 'a')]:
+        cache.get(run, tag, _events(range(2)), decode)
+    cache.evict_run('run0')
+    assert _stats(cache, 'entries', 'bytes', 'evictions') == (1, 16, 2)
+    cache.get('run1', 'a', _events(range(2)), decode)
+    cache.get('run0', 'a', _events(range(2)), decode)
+    assert _stats(cache, 'hits', 'misses') == (1, 4)
@@ -1 +1,2 @@
 from .config_writer import *
+from .aggregate_writer import *
@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+
+import numpy as np
+import tensorflow as tf
+
+# Summaries of the running aggregates of a tag are written under the tag with this suffix
+AGGREGATE_TAG_SUFFIX = '/paramplot_aggregates'
+# The plugin the aggregate summaries belong to, so that the scalars dashboard does not show them
+PLUGIN_NAME = 'paramplot'
+# The order of the aggregates in the float64 vector of each summary
+AGGREGATE_FIELDS = ('count', 'sum', 'min', 'max', 'last_value')
+
+
+def aggregate_tag(tag):
+    return tag + AGGREGATE_TAG_SUFFIX
+
+
+class RunningAggregates:
+    """The running count, sum, min, max and last value of the values of a single tag"""
+    def __init__(self):
+      self.count = 0
+      self.sum = 0.0
+      self.min = math.inf
+      self.max = -math.inf
+      self.last_value = math.nan
+
+    def Add(self, value):
+      value = float(value)
+      self.last_value = value
+      if math.isnan(value):
+        return
+      self.count += 1
+      self.sum += value
+      self.min = min(self.min, value)
+      self.max = max(self.max, value)
+
+    def ToArray(self):
+      return np.array([getattr(self, field) for field in AGGREGATE_FIELDS], dtype=np.float64)
+
+
+class ParamPlotAggregateWriter:
+    """Keeps the running aggregates of each tag while training and writes them as summaries, rather than a summary per step.
+
+    The aggregates of every tag are written as a single float64 vector under the tag with AGGREGATE_TAG_SUFFIX,
+    every flush_every values and when the writer is flushed or closed. The paramplot plugin reads the most recent of
+    these summaries instead of aggregating every step of the tag, so its min, max and average cover the whole of
+    training even when the accumulator only keeps a sample of the steps.
+    """
+    def __init__(self, file_writer, flush_every=100):
+      self.file_writer = file_writer
+      self.flush_every = flush_every
+      self._aggregates = {}
+      self._dirty = set()
+      self._step = 0
+      self._unflushed = 0
+
+    def AddValue(self, tag, value, step=None):
+      """Adds a value of the tag. The tag must be the full tag of the summary the value is written to (including the
+      name scope and any suffix added by the summary op), otherwise paramplot will not match the aggregates to it."""
+      if tag not in self._aggregates:
+        self._aggregates[tag] = RunningAggregates()
+      self._aggregates[tag].Add(value)
+      self._dirty.add(tag)
+      if step is not None:
+        self._step = max(self._step, step)
+      self._unflushed += 1
+      if self.flush_every and self._unflushed >= self.flush_every:
+        self.Flush()
+
+    def AddValuesByDict(self, tag_value_map, step=None):
+      for tag in tag_value_map:
+        self.AddValue(tag, tag_value_map[tag], step)
+
+    def GetAggregates(self, tag):
+      return self._aggregates[tag]
+
+    def Flush(self):
+      # Only the tags whose aggregates have changed since the last flush are written
+      if self._dirty:
+        metadata = tf.SummaryMetadata(plugin_data=tf.SummaryMetadata.PluginData(plugin_name=PLUGIN_NAME))
+        summary = tf.Summary(value=[
+            tf.Summary.Value(tag=aggregate_tag(tag), metadata=metadata,
+                             tensor=tf.make_tensor_proto(self._aggregates[tag].ToArray()))
+            for tag in sorted(self._dirty)])
+        self.file_writer.add_summary(summary, self._step)
+        self._dirty = set()
+      self._unflushed = 0
+      self.file_writer.flush()
+
+    def Close(self):
+      self.Flush()
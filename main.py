@@ -7,22 +7,24 @@ import shutil
 import pathlib
 
 from tensorboard import default
-from tensorboard.program import TensorBoard
-# from .backend import program
 
 if sys.version_info[0] < 3:
+    from backend import program
     from paramplot import paramplot_plugin
     from runsenabler import runsenabler_loader
     print(sys.version_info)
 else:
     print(sys.version_info)
+    from .backend import program
     from .paramplot import paramplot_plugin
     from .runsenabler import runsenabler_loader
 
 def run_main(asset_path):
     loader = runsenabler_loader.RunsEnablerLoader("some_dir")
     plugins = default.get_plugins() + [paramplot_plugin.ParamPlotPlugin, loader]
-    gr_tensorboard = TensorBoard(plugins, lambda: open(asset_path, 'rb'))
+    # The gr backend builds the multiplexer from the runsenabler flags (size guidance, lazy loading, snapshots) and leaves
+    # reloading to the shared reload coordinator rather than running the stock reload thread as well
+    gr_tensorboard = program.GRTensorBoard(plugins, lambda: open(asset_path, 'rb'))
     gr_tensorboard.configure(sys.argv)
 
     use_filesystem_controller = gr_tensorboard.flags.use_filesystem_controller
@@ -35,8 +37,8 @@ def run_main(asset_path):
         new_logdir = parent_dir / "temp_dir"
         print("creating temporary workspace in " + str(new_logdir))
 
-        # Create the temp dir
-        new_logdir.mkdir(parents=True)
+        # Create the temp dir, or reuse the one left by the last start
+        new_logdir.mkdir(parents=True, exist_ok=gr_tensorboard.flags.warm_restart)
 
         # swap the original logdir for the new one
         gr_tensorboard.flags.logdir = str(new_logdir)
@@ -44,7 +46,9 @@ def run_main(asset_path):
     try:
         sys.exit(gr_tensorboard.main())
     finally:
-        if use_filesystem_controller:
+        if use_filesystem_controller and gr_tensorboard.flags.warm_restart:
+            loader.save_workspace()
+        elif use_filesystem_controller:
             shutil.rmtree(str(new_logdir))
             
 
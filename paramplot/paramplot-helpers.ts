@@ -19,6 +19,116 @@ namespace gr_paramplot_dashboard {
         }
     }
 
+    export const BINARY_CONTENT_TYPE = 'application/x-paramplot-series';
+
+    type SeriesHeader = {name: string, length: number, x?: any[]};
+
+    /**
+     * Decodes a response in the binary series encoding (see encode_binary_payloads in paramplot_response.py) into
+     * the same payloads as the JSON encoding: an object mapping each series name to its [x, metric] pairs. The
+     * response holds one frame per payload.
+     */
+    export function decodeBinaryPayloads(buffer: ArrayBuffer, many: boolean): any {
+        const view = new DataView(buffer);
+        const decoder = new TextDecoder('utf-8');
+        let offset = 0;
+        const nextArray = (length: number) => {
+            const array = new Float64Array(buffer, offset, length);
+            offset += length * Float64Array.BYTES_PER_ELEMENT;
+            return array;
+        };
+        const payloads = [];
+        while (offset < buffer.byteLength) {
+            const headerLength = view.getUint32(offset, true);
+            const header: SeriesHeader[] = JSON.parse(decoder.decode(new Uint8Array(buffer, offset + 4, headerLength)));
+            offset += 4 + headerLength;
+            const payload = {};
+            header.forEach(series => {
+                const x = series.x || nextArray(series.length);
+                const metrics = nextArray(series.length);
+                payload[series.name] = Array.from(metrics, (metric, index) => [x[index], metric]);
+            });
+            payloads.push(payload);
+        }
+        return many ? payloads : payloads[0];
+    }
+
+    type PendingRequest = {
+        query: {[key: string]: string},
+        resolve: (payload: any) => void,
+        reject: (error: any) => void,
+    };
+
+    /**
+     * Stands in for a tf_backend.RequestManager for the paramplot cards. Requests to /paramdatabytag made within a
+     * short window of each other are sent as a single /paramdatabytags request, so that a page of charts needs one
+     * pass over the runs in the backend rather than one per chart. Any other request is passed straight through.
+     */
+    export class ParamDataBatcher {
+        private pending: PendingRequest[] = [];
+        private flushTimer: number = null;
+
+        constructor(private requestManager: tf_backend.RequestManager, private delayMs = 20, private maxQueries = 100,
+                    private binary = true) {
+        }
+
+        request(url: string, postData?: {[key: string]: string}): Promise<any> {
+            const [path, queryString] = url.split('?');
+            if (!path.endsWith('/paramdatabytag') || postData) {
+                return this.requestManager.request(url, postData);
+            }
+            const query = {};
+            new URLSearchParams(queryString).forEach((value, key) => query[key] = value);
+            return new Promise((resolve, reject) => {
+                this.pending.push({query, resolve, reject});
+                if (this.pending.length >= this.maxQueries) {
+                    this.flush();
+                } else if (this.flushTimer === null) {
+                    this.flushTimer = window.setTimeout(() => this.flush(), this.delayMs);
+                }
+            });
+        }
+
+        private flush() {
+            if (this.flushTimer !== null) {
+                window.clearTimeout(this.flushTimer);
+                this.flushTimer = null;
+            }
+            const batch = this.pending;
+            this.pending = [];
+            if (batch.length === 0) {
+                return;
+            }
+            // The queries are POSTed, as a query string holding up to maxQueries of them can be too long for the server
+            const url = tf_backend.getRouter().pluginRoute('paramplot', '/paramdatabytags');
+            const postData = {
+                requests: JSON.stringify(batch.map(pending => pending.query)),
+                stream: 'true',
+            };
+            this.requestPayloads(url, postData).then(
+                payloads => batch.forEach((pending, index) => pending.resolve(payloads[index])),
+                error => batch.forEach(pending => pending.reject(error)));
+        }
+
+        private requestPayloads(url: string, postData: {[key: string]: string}): Promise<any[]> {
+            if (!this.binary) {
+                return this.requestManager.request(url, postData);
+            }
+            // The series are sent as float64 arrays, which are much quicker to decode than the equivalent JSON
+            return fetch(url, {
+                method: 'POST',
+                credentials: 'same-origin',
+                headers: {'Accept': BINARY_CONTENT_TYPE},
+                body: new URLSearchParams(postData),
+            }).then(response => {
+                if (!response.ok) {
+                    throw new Error(`Failed to load ${url}: ${response.status} ${response.statusText}`);
+                }
+                return response.arrayBuffer();
+            }).then(buffer => decodeBinaryPayloads(buffer, true));
+        }
+    }
+
     export const paramplot_tooltip_columns = (parameter: string, tag: string) => [
         {
             title: 'Series Key',
@@ -34,5 +144,7 @@ namespace gr_paramplot_dashboard {
         }
     ];
 
+    export const PARAMPLOT_MAX_POINTS = 1000;
+
     export const PARAMPLOT_TOOLTIP_POSITION = vz_chart_helper.TooltipPosition.AUTO;
 }
\ No newline at end of file
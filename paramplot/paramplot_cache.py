@@ -0,0 +1,115 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import threading
+
+import numpy as np
+
+from .paramplot_decoder import decode_aggregate_summary, decode_scalar_events
+
+
+class RunningAggregate:
+    """The running min, max, sum, count and most recent value of the tensor events of a single run and tag"""
+    __slots__ = ('accumulator', 'num_events', 'last_wall_time', 'count', 'sum', 'min', 'max', 'last_value')
+
+    def __init__(self, accumulator):
+        # The accumulator the events came from - if the run is disabled and enabled again it gets a new accumulator
+        self.accumulator = accumulator
+        self.num_events = 0
+        self.last_wall_time = -np.inf
+        self.count = 0
+        self.sum = 0.0
+        # NaN until a value which is not NaN has been seen, as fmin and fmax only return NaN when both values are NaN
+        self.min = np.nan
+        self.max = np.nan
+        self.last_value = np.nan
+
+    def update(self, num_events, values, wall_times):
+        # Tensor events are ordered by step and the reservoir always keeps the most recent event, so the events which
+        # have not been seen yet are the ones after the last wall time we saw
+        self.num_events = num_events
+        new = wall_times > self.last_wall_time
+        if not np.any(new):
+            return
+        values = values[new]
+        wall_times = wall_times[new]
+        self.count += len(values)
+        self.sum += np.sum(values)
+        # fmin and fmax skip NaN values, so the result does not depend on the order the events arrive in
+        self.min = np.fmin(self.min, np.fmin.reduce(values))
+        self.max = np.fmax(self.max, np.fmax.reduce(values))
+        most_recent = np.argmax(wall_times)
+        self.last_value = values[most_recent]
+        self.last_wall_time = wall_times[most_recent]
+
+    def load_summary(self, summary_events):
+        # The most recent summary of the aggregates covers every value written for the tag, so replaces the aggregates
+        self.num_events = len(summary_events)
+        latest = max(summary_events, key=lambda event: (event.step, event.wall_time))
+        self.count, self.sum, self.min, self.max, self.last_value = decode_aggregate_summary(latest)
+        self.last_wall_time = summary_events[-1].wall_time
+
+    def is_current(self, accumulator, tensor_events):
+        return (self.accumulator is accumulator and self.num_events == len(tensor_events)
+                and (not tensor_events or tensor_events[-1].wall_time == self.last_wall_time))
+
+
+class AggregateCache:
+    """Caches the aggregates of the tensor events of each (run, tag).
+
+    An entry is reused for as long as the number of events and the wall time of the last event are unchanged. When a
+    run grows only the new events are decoded and folded into the running aggregates, so the aggregates cover every
+    event the plugin has seen rather than just those currently held in the accumulator's reservoir. The events are
+    decoded through the process wide decoded tensor cache.
+    """
+    def __init__(self, tensor_cache):
+        self._tensor_cache = tensor_cache
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, run, tag, accumulator, tensor_events):
+        """Returns the up to date RunningAggregate of the run and tag"""
+        key = (run, tag)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.is_current(accumulator, tensor_events):
+                self.hits += 1
+                return entry
+            self.misses += 1
+            if entry is None or entry.accumulator is not accumulator:
+                entry = RunningAggregate(accumulator)
+                self._entries[key] = entry
+        # Decode without holding the lock so that requests for other runs and tags are not held up. Events which a
+        # concurrent request has already folded in are skipped by update, as they are not newer than its last wall time.
+        values, wall_times, _ = self._tensor_cache.get(run, tag, tensor_events, decode_scalar_events)
+        with self._lock:
+            entry.update(len(tensor_events), values, wall_times)
+        return entry
+
+    def get_summary(self, run, tag, accumulator, summary_events):
+        """Returns the RunningAggregate of the run and tag read from the most recent of its aggregate summaries (written
+        by lib.aggregate_writer) rather than from its raw tensor events"""
+        key = (run, tag, 'summary')
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.is_current(accumulator, summary_events):
+                self.hits += 1
+                return entry
+            self.misses += 1
+            entry = RunningAggregate(accumulator)
+            entry.load_summary(summary_events)
+            self._entries[key] = entry
+            return entry
+
+    def retain_runs(self, runs):
+        """Evicts the entries of every run which is not in runs, e.g. because it has been disabled"""
+        runs = set(runs)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] not in runs]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
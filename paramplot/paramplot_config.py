@@ -0,0 +1,112 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import concurrent.futures
+import json
+import os
+
+from gr_tensorboard.backend.logging import get_logger
+
+RUN_PARAMS_FILE = 'runparams.json'
+
+_logger = get_logger()
+
+
+def _stat_key(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _read_config(path):
+    # Returns the parsed config and None, or None and the error which stopped it being read
+    try:
+        with open(path, 'r') as config_file_handle:
+            return json.loads(config_file_handle.read()), None
+    except (OSError, ValueError) as e:
+        return None, e
+
+
+class RunParamsLoader:
+    """Loads the runparams.json of every run, keeping the parsed configs between loads.
+
+    Each file is only parsed again when its (mtime, size) changes, runs which have gone away (or lost their
+    runparams.json) are dropped, and the union of the parameter names is kept up to date from a count of the runs
+    which have each parameter. The first load, which has to parse every file, is spread over a thread pool.
+    """
+    def __init__(self, logdir, num_threads=8):
+        self._logdir = logdir
+        self._num_threads = num_threads
+        # Maps each run to its parsed config
+        self.configs = {}
+        # Maps each run to the (mtime, size) of its runparams.json when it was parsed
+        self._stat_keys = {}
+        self._parameter_counts = collections.Counter()
+        self._loaded = False
+
+    @property
+    def parameters(self):
+        return set(self._parameter_counts)
+
+    def _path(self, run):
+        return os.path.join(self._logdir, run, RUN_PARAMS_FILE)
+
+    def _set_config(self, run, config, stat_key):
+        self._remove_config(run)
+        self.configs[run] = config
+        self._stat_keys[run] = stat_key
+        self._parameter_counts.update(config.keys())
+
+    def _remove_config(self, run):
+        config = self.configs.pop(run, None)
+        self._stat_keys.pop(run, None)
+        if config is not None:
+            self._parameter_counts.subtract(config.keys())
+            # Drop the parameters which no run has any more
+            self._parameter_counts += collections.Counter()
+
+    def load(self, runs):
+        """Brings the configs up to date with the runparams.json files of the runs.
+
+        Returns:
+          Whether any config was added, changed or removed.
+        """
+        runs = set(runs)
+        changed = False
+        for run in [run for run in self.configs if run not in runs]:
+            self._remove_config(run)
+            changed = True
+
+        stale = {}
+        for run in runs:
+            stat_key = _stat_key(self._path(run))
+            if stat_key is None:
+                if run in self.configs:
+                    self._remove_config(run)
+                    changed = True
+            elif self._stat_keys.get(run) != stat_key:
+                stale[run] = stat_key
+        if not stale:
+            self._loaded = True
+            return changed
+
+        paths = [self._path(run) for run in stale]
+        if not self._loaded and self._num_threads > 1 and len(stale) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self._num_threads) as executor:
+                results = list(executor.map(_read_config, paths))
+        else:
+            results = [_read_config(path) for path in paths]
+
+        for run, (config, error) in zip(stale, results):
+            if error is not None:
+                # Most likely the file is still being written, so it is parsed again on the next load
+                _logger.info("Unable to read the run parameters of '%s': %s" % (run, error))
+                continue
+            self._set_config(run, config, stale[run])
+            changed = True
+        self._loaded = True
+        return changed
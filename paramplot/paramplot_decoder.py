@@ -0,0 +1,78 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.core.framework import types_pb2
+
+from gr_tensorboard.lib.aggregate_writer import AGGREGATE_FIELDS
+
+# The repeated field of the TensorProto which holds the values of each dtype when tensor_content is not used
+_VALUE_FIELDS = {
+    types_pb2.DT_FLOAT: 'float_val',
+    types_pb2.DT_DOUBLE: 'double_val',
+    types_pb2.DT_INT8: 'int_val',
+    types_pb2.DT_INT16: 'int_val',
+    types_pb2.DT_INT32: 'int_val',
+    types_pb2.DT_UINT8: 'int_val',
+    types_pb2.DT_UINT16: 'int_val',
+    types_pb2.DT_INT64: 'int64_val',
+    types_pb2.DT_BOOL: 'bool_val',
+    types_pb2.DT_HALF: 'half_val',
+}
+
+
+def _decode_values(protos, values):
+    # Fills values from the protos without building an ndarray per event, returning False if the protos are not all
+    # scalars of the same dtype
+    dtype = protos[0].dtype
+    if any(proto.dtype != dtype for proto in protos):
+        return False
+
+    if all(proto.tensor_content for proto in protos):
+        content = np.frombuffer(b''.join(proto.tensor_content for proto in protos),
+                                dtype=tf.as_dtype(dtype).as_numpy_dtype)
+        if len(content) != len(protos):
+            return False
+        values[:] = content
+        return True
+
+    field = _VALUE_FIELDS.get(dtype)
+    if field is None or any(len(getattr(proto, field)) != 1 for proto in protos):
+        return False
+    raw = np.fromiter((getattr(proto, field)[0] for proto in protos), dtype=np.float64, count=len(protos))
+    if dtype == types_pb2.DT_HALF:
+        # half_val holds the bit patterns of the float16 values
+        raw = raw.astype(np.uint16).view(np.float16)
+    values[:] = raw
+    return True
+
+
+def decode_scalar_events(tensor_events):
+    """Decodes the scalar tensors of a list of tensor events into NumPy arrays.
+
+    Returns:
+      A tuple of float64 arrays of the values and wall times, and an int64 array of the steps, of the events.
+    """
+    num_events = len(tensor_events)
+    values = np.empty(num_events, dtype=np.float64)
+    wall_times = np.fromiter((event.wall_time for event in tensor_events), dtype=np.float64, count=num_events)
+    steps = np.fromiter((event.step for event in tensor_events), dtype=np.int64, count=num_events)
+    if num_events == 0:
+        return values, wall_times, steps
+
+    protos = [event.tensor_proto for event in tensor_events]
+    if not _decode_values(protos, values):
+        # Mixed dtypes or non scalar tensors, which the plugin has never supported beyond taking the only element
+        for index, proto in enumerate(protos):
+            values[index] = tf.make_ndarray(proto).item()
+    return values, wall_times, steps
+
+
+def decode_aggregate_summary(tensor_event):
+    """Decodes the float64 vector of a summary written by lib.aggregate_writer into its count, sum, min, max and last
+    value"""
+    values = tf.make_ndarray(tensor_event.tensor_proto).astype(np.float64).ravel()
+    count, sum_, min_, max_, last_value = values[:len(AGGREGATE_FIELDS)]
+    return int(count), sum_, min_, max_, last_value
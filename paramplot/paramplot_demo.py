@@ -23,6 +23,7 @@ import random
 
 import tensorflow as tf
 from tensorboard.plugins.scalar import summary
+from lib.aggregate_writer import ParamPlotAggregateWriter
 from lib.config_writer import ParamPlotConfigWriter
 
 # Directory into which to write tensorboard data.
@@ -40,6 +41,8 @@ def run(logdir, run_name, tag_value_map, parameter_map):
     run_path = os.path.join(logdir, run_name)
     writer = tf.summary.FileWriter(run_path)
     config_writer = ParamPlotConfigWriter(run_path)
+    # Keeps the running aggregates of every metric so that paramplot need not aggregate every sample
+    aggregate_writer = ParamPlotAggregateWriter(writer)
 
     # Add the parameters to the run config
     config_writer.SetParameters(parameter_map)
@@ -47,11 +50,16 @@ def run(logdir, run_name, tag_value_map, parameter_map):
     # Write the value under the final_loss summary for that particular run
     with tf.Session() as session:
         for tag_name in tag_value_map:
-            for _ in range(tag_value_map[tag_name]["samples"]):
-                summary_data = session.run(summary_ops[tag_name], feed_dict={placeholders[tag_name]: tag_value_map[tag_name]["func"]()})
+            for step in range(tag_value_map[tag_name]["samples"]):
+                value = tag_value_map[tag_name]["func"]()
+                summary_data = session.run(summary_ops[tag_name], feed_dict={placeholders[tag_name]: value})
                 writer.add_summary(summary_data)
+                # The aggregates are kept under the tag the summary op actually wrote (which includes any name scope)
+                summary_tag = tf.Summary.FromString(summary_data).value[0].tag
+                aggregate_writer.AddValue(summary_tag, value, step)
 
     config_writer.Save()
+    aggregate_writer.Close()
     writer.close()
 
 
@@ -0,0 +1,114 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numbers
+
+import numpy as np
+
+MEAN = 'mean'
+MIN = 'min'
+MAX = 'max'
+BIN_STATISTICS = (MEAN, MIN, MAX)
+
+# LTTB keeps both ends and at least one point in between, so it cannot reduce a series to fewer points than this
+MIN_MAX_POINTS = 3
+
+
+def bin_points(x, y, bins, statistic=MEAN):
+    """Bins the points into equal width bins over the range of x.
+
+    Returns:
+      The x values of the centres of the non empty bins, and the mean, min or max of the y values in each of them.
+      NaN y values are ignored, so a bin with only NaN values has the value NaN.
+    """
+    edges = np.linspace(np.amin(x), np.amax(x), bins + 1)
+    # digitize against the inner edges so that the maximum x falls in the last bin rather than after it
+    indices = np.digitize(x, edges[1:-1])
+    order = np.argsort(indices, kind='stable')
+    indices = indices[order]
+    y = y[order]
+    occupied, starts = np.unique(indices, return_index=True)
+    centres = (edges[occupied] + edges[occupied + 1]) / 2
+
+    if statistic == MEAN:
+        valid = ~np.isnan(y)
+        sums = np.add.reduceat(np.where(valid, y, 0.0), starts)
+        counts = np.add.reduceat(valid.astype(np.int64), starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return centres, sums / counts
+    # fmin and fmax ignore NaN unless every value in the bin is NaN
+    reduce = np.fmin if statistic == MIN else np.fmax
+    return centres, reduce.reduceat(y, starts)
+
+
+def lttb(x, y, max_points):
+    """Downsamples the points, sorted by x, to max_points with the Largest Triangle Three Buckets algorithm.
+
+    The first and last points are always kept. The remaining points are split into max_points - 2 buckets, and from
+    each bucket the point which forms the largest triangle with the point kept from the previous bucket and the mean
+    of the next bucket is kept.
+
+    Returns:
+      The indices of the points which are kept.
+    """
+    num_points = len(x)
+    if max_points < MIN_MAX_POINTS:
+        raise ValueError('max_points must be at least %d' % MIN_MAX_POINTS)
+    if max_points >= num_points:
+        return np.arange(num_points)
+
+    # The bucket boundaries of the points between the first and the last
+    boundaries = np.linspace(1, num_points - 1, max_points - 1).astype(np.int64)
+    # Fill the NaN values with 0 so that they do not poison the triangle areas
+    y_filled = np.where(np.isnan(y), 0.0, y)
+    kept = np.empty(max_points, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = num_points - 1
+    for bucket in range(max_points - 2):
+        start, end = boundaries[bucket], boundaries[bucket + 1]
+        if bucket + 2 < len(boundaries):
+            next_x = np.mean(x[end:boundaries[bucket + 2]])
+            next_y = np.mean(y_filled[end:boundaries[bucket + 2]])
+        else:
+            next_x, next_y = x[-1], y_filled[-1]
+        previous = kept[bucket]
+        areas = np.abs((x[previous] - next_x) * (y_filled[start:end] - y_filled[previous])
+                       - (x[previous] - x[start:end]) * (next_y - y_filled[previous]))
+        kept[bucket + 1] = start + np.argmax(areas)
+    return kept
+
+
+def downsample_points(points, bins=None, statistic=MEAN, max_points=None):
+    """Bins and/or downsamples a list of (x, y) points, returning them unchanged if their x values are not all
+    numbers or there are no more of them than the number of bins or max_points.
+
+    Points whose x value is NaN (runs without the parameter) are dropped, as they cannot be placed on the x axis.
+    """
+    if not points or not all(isinstance(point[0], numbers.Real) and not isinstance(point[0], bool) for point in points):
+        return points
+    x = np.fromiter((point[0] for point in points), dtype=np.float64, count=len(points))
+    y = np.fromiter((point[1] for point in points), dtype=np.float64, count=len(points))
+    present = ~np.isnan(x)
+    x = x[present]
+    y = y[present]
+
+    if bins and len(x) > bins:
+        x, y = bin_points(x, y, bins, statistic)
+    if max_points and len(x) > max_points:
+        order = np.argsort(x, kind='stable')
+        x = x[order]
+        y = y[order]
+        kept = lttb(x, y, max_points)
+        x = x[kept]
+        y = y[kept]
+    elif len(x) == len(points):
+        return points
+    return list(zip(x.tolist(), y.tolist()))
+
+
+def downsample_payload(payload, bins=None, statistic=MEAN, max_points=None):
+    """Applies downsample_points to each series of a payload of (series name, points) pairs as it is iterated"""
+    if not bins and not max_points:
+        return payload
+    return ((name, downsample_points(points, bins, statistic, max_points)) for name, points in payload)
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from gr_tensorboard.paramplot import paramplot_downsample
+from gr_tensorboard.paramplot.paramplot_downsample import MAX, MEAN, MIN, bin_points, downsample_points, lttb
+
+def test_bin_points_statistics():
+    x = np.array([0.0, 1.0, 2.0, 9.0, 10.0])
+    y = np.array([1.0, 3.0, np.nan, 4.0, 6.0])
+    # bins [0, 5) and [5, 10], with the maximum x in the last bin
+    for statistic, expected in [(MEAN, [2.0, 5.0]), (MIN, [1.0, 4.0]), (MAX, [3.0, 6.0])]:
+        centres, values = bin_points(x, y, 2, statistic)
+        np.testing.assert_array_equal(centres, [2.5, 7.5])
+        np.testing.assert_array_equal(values, expected)
+
+def test_bin_points_skips_empty_bins_and_keeps_all_nan_bins():
+    x = np.array([0.0, 0.5, 10.0])
+    y = np.array([np.nan, np.nan, 1.0])
+    for statistic in (MEAN, MIN, MAX):
+        centres, values = bin_points(x, y, 4, statistic)
+        np.testing.assert_array_equal(centres, [1.25, 8.75])
+        np.testing.assert_array_equal(values, [np.nan, 1.0])
+
+def test_bin_points_unsorted():
+    x = np.array([10.0, 0.0, 9.0, 1.0])
+    y = np.array([4.0, 1.0, 2.0, 3.0])
+    centres, values = bin_points(x, y, 2, MEAN)
+    np.testing.assert_array_equal(values, [2.0, 3.0])
+
+def test_lttb_keeps_the_ends_and_the_peaks():
+    x = np.arange(100, dtype=np.float64)
+    y = np.zeros(100)
+    y[30] = 10.0
+    y[70] = -10.0
+    kept = lttb(x, y, 4)
+    assert kept.tolist() == [0, 30, 70, 99]
+
+def test_lttb_returns_every_point_when_there_are_few():
+    x = np.arange(5, dtype=np.float64)
+    assert lttb(x, x, 5).tolist() == [0, 1, 2, 3, 4]
+    assert lttb(x, x, 10).tolist() == [0, 1, 2, 3, 4]
+
+def test_lttb_output_is_sorted_and_sized():
+    rng = np.random.RandomState(0)
+    x = np.arange(1000, dtype=np.float64)
+    y = rng.randn(1000)
+    y[rng.randint(0, 1000, 50)] = np.nan
+    for max_points in (3, 10, 999):
+        kept = lttb(x, y, max_points)
+        assert len(kept) == max_points
+        assert kept[0] == 0 and kept[-1] == 999
+        assert (np.diff(kept) > 0).all()
+
+@pytest.mark.parametrize('max_points', [-1, 0, 1, 2])
+def test_lttb_rejects_max_points_below_minimum(max_points):
+    assert paramplot_downsample.MIN_MAX_POINTS == 3
+    x = np.arange(10, dtype=np.float64)
+    with pytest.raises(ValueError):
+        lttb(x, x, max_points)
+
+def test_downsample_points_unchanged():
+    points = [(0, 1.0), (1, 2.0), (2, 3.0)]
+    assert downsample_points(points, bins=3) is points
+    assert downsample_points(points, max_points=3) is points
+    assert downsample_points([]) == []
+    categorical = [('adam', 1.0), ('sgd', 2.0), ('adam', 3.0), ('sgd', 4.0)]
+    assert downsample_points(categorical, bins=1, max_points=3) is categorical
+    booleans = [(True, 1.0), (False, 2.0), (True, 3.0), (False, 4.0)]
+    assert downsample_points(booleans, bins=1) is booleans
+
+def test_downsample_points_drops_nan_x():
+    points = [(0.0, 1.0), (float('nan'), 2.0), (1.0, 3.0)]
+    assert downsample_points(points, bins=5) == [(0.0, 1.0), (1.0, 3.0)]
+
+def test_downsample_points_bins():
+    points = [(0, 1.0), (1, 3.0), (9, 4.0), (10, 6.0)]
+    assert downsample_points(points, bins=2) == [(2.5, 2.0), (7.5, 5.0)]
+    assert downsample_points(points, bins=2, statistic=MAX) == [(2.5, 3.0), (7.5, 6.0)]
+
+def test_downsample_points_max_points_sorts_by_x():
+    points = [(float(x), 0.0) for x in range(99, -1, -1)]
+    points[99 - 30] = (30.0, 10.0)
+    assert downsample_points(points, max_points=3) == [(0.0, 0.0), (30.0, 10.0), (99.0, 0.0)]
+
+def test_downsample_payload():
+    payload = [('a', [(0, 1.0), (1, 3.0), (9, 4.0), (10, 6.0)]), ('b', [(0, 1.0)])]
+    assert paramplot_downsample.downsample_payload(payload) is payload
+    assert list(paramplot_downsample.downsample_payload(payload, bins=2)) == [
+        ('a', [(2.5, 2.0), (7.5, 5.0)]), ('b', [(0, 1.0)])]
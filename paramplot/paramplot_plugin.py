@@ -16,6 +16,17 @@ from tensorboard.backend import http_util
 from tensorboard.backend.event_processing import event_multiplexer
 from tensorboard.plugins import base_plugin
 
+from gr_tensorboard.backend.metrics import get_metrics, instrument_routes
+from gr_tensorboard.backend.reload_coordinator import get_reload_coordinator
+from gr_tensorboard.backend.tensor_cache import get_tensor_cache
+from gr_tensorboard.lib.aggregate_writer import AGGREGATE_TAG_SUFFIX, aggregate_tag
+from gr_tensorboard.lib.aggregate_writer import PLUGIN_NAME as AGGREGATE_PLUGIN_NAME
+from .paramplot_cache import AggregateCache
+from .paramplot_config import RunParamsLoader
+from .paramplot_downsample import BIN_STATISTICS, MEAN, MIN_MAX_POINTS, downsample_payload
+from .paramplot_response import accepts_binary, encode_binary_payloads, iter_json_payloads, respond_binary, respond_streaming_json
+from .paramplot_table import ParameterTable, group_nanmeans, split_groups
+
 
 class ParamPlotPlugin(base_plugin.TBPlugin):
     """A plugin that serves greetings recorded during model runs."""
@@ -40,27 +51,42 @@ class ParamPlotPlugin(base_plugin.TBPlugin):
         # to it.
         self._multiplexer = context.multiplexer
         self._context = context
+        self._reloader = get_reload_coordinator(self._multiplexer, context.flags.reload_interval)
 
-        # Default value for a parameter which does not exist for a particular run is nan
-        self._parameter_config = collections.defaultdict(lambda: collections.defaultdict(lambda: np.nan))
+        # Parses the runparams.json of each run, only reading the files which have changed since the last load
+        self._config_loader = RunParamsLoader(self._context.logdir)
+        self._parameter_config = self._config_loader.configs
         self.parameters = set()
         self.printer = pprint.PrettyPrinter(indent=4)
+        # --tensor_cache_mb is defined by runsenabler, so keep the default budget when paramplot is loaded without it
+        tensor_cache_mb = getattr(context.flags, 'tensor_cache_mb', None)
+        self._tensor_cache = get_tensor_cache(tensor_cache_mb * 1024 * 1024 if tensor_cache_mb is not None else None)
+        self._aggregate_cache = AggregateCache(self._tensor_cache)
+        # Columnar copy of the parameter config which is used to group the runs into series
+        self._table = None
+        self._register_metrics()
+
+    def _register_metrics(self):
+        registry = get_metrics()
+        registry.callback('grtensorboard_paramplot_aggregate_cache_hits_total', 'Aggregates served from the aggregate cache',
+                          'counter', lambda: self._aggregate_cache.hits)
+        registry.callback('grtensorboard_paramplot_aggregate_cache_misses_total', 'Aggregates which had to be computed',
+                          'counter', lambda: self._aggregate_cache.misses)
+        registry.callback('grtensorboard_paramplot_aggregate_cache_entries', 'The aggregates in the aggregate cache',
+                          'gauge', lambda: len(self._aggregate_cache))
 
     def _compute_config(self):
-        # Read in all the config files in each run and create the combined config
-        for run_name in self._multiplexer.Runs().keys():
-            run_path = os.path.join(self._context.logdir, run_name, 'runparams.json')
-            if os.path.exists(run_path):
-                with open(run_path, 'r') as config_file_handle:
-                    self._parameter_config[run_name] = json.loads(config_file_handle.read())
-
-        # Calculate the list of parameters which have values
-        parameter_keys = [set(x.keys()) for x in self._parameter_config.values()]
-        if parameter_keys:
-            self.parameters = set.union(*parameter_keys)
+        # Bring the combined config up to date with the config files in each run
+        if self._config_loader.load(self._multiplexer.Runs().keys()):
+            # Calculate the list of parameters which have values
+            self.parameters = self._config_loader.parameters
+            self._table = None
 
     def _get_valid_runs(self):
-        return [run for run in self._multiplexer.Runs() if run in self._parameter_config]
+        runs = [run for run in self._multiplexer.Runs() if run in self._parameter_config]
+        # Drop the cached aggregates of runs which have been disabled
+        self._aggregate_cache.retain_runs(runs)
+        return runs
 
     @wrappers.Request.application
     def tags_route(self, request):
@@ -83,6 +109,13 @@ class ParamPlotPlugin(base_plugin.TBPlugin):
             for (run, tagToContent) in all_runs.items()
         }
 
+        # Tags which only have aggregate summaries (see lib.aggregate_writer) are plotted from those summaries
+        for (run, tagToContent) in self._multiplexer.PluginRunToTagToContent(AGGREGATE_PLUGIN_NAME).items():
+            tags = response.setdefault(run, [])
+            for tag in tagToContent:
+                if tag.endswith(AGGREGATE_TAG_SUFFIX) and tag[:-len(AGGREGATE_TAG_SUFFIX)] not in tags:
+                    tags.append(tag[:-len(AGGREGATE_TAG_SUFFIX)])
+
         return http_util.Respond(request, response, 'application/json')
 
     def get_plugin_apps(self):
@@ -96,11 +129,13 @@ class ParamPlotPlugin(base_plugin.TBPlugin):
         """
         # Note that the methods handling routes are decorated with
         # @wrappers.Request.application.
-        return {
+        return instrument_routes(self.plugin_name, {
             '/tags': self.tags_route,
             '/paramdatabytag': self._paramdatabytag_route,
+            '/paramdatabytags': self._paramdatabytags_route,
             '/parameters': self._parameters_route,
-        }
+            '/cachestats': self._cachestats_route,
+        })
 
     def is_active(self):
         """Determines whether this plugin is active.
@@ -116,70 +151,170 @@ class ParamPlotPlugin(base_plugin.TBPlugin):
         # The plugin is active if there are any runs in the runparam dictionary which are in the logdir
         return bool(any(self._get_valid_runs()))
 
-    def aggregate_tensor_events(self, tensor_events, aggregation):
-        event_list = [tf.make_ndarray(event.tensor_proto).item() for event in tensor_events]
-        events_ndarray = np.array(event_list) # Sam - could just wrap above list comp in np.array
-        
+    @staticmethod
+    def _aggregate_value(aggregate, aggregation):
+        if aggregate is None or aggregate.count == 0:
+            return np.nan
         if aggregation == ParamPlotPlugin.MIN:
-            return np.amin(events_ndarray)
+            return aggregate.min
         elif aggregation == ParamPlotPlugin.MAX:
-            return np.amax(events_ndarray)
+            return aggregate.max
         elif aggregation == ParamPlotPlugin.AVERAGE:
-            return np.mean(events_ndarray)
+            return aggregate.sum / aggregate.count
         else:
             # Default to the most recent value semantics
-            event_result = max(tensor_events, key=(lambda ev: ev.wall_time))
-            return tf.make_ndarray(event_result.tensor_proto).item()
-
-    def _get_tensor_events_payload_by_key(self, parameter, tag, aggregation, seriesKey):
-        processed_events = collections.defaultdict(lambda: collections.defaultdict(list))
-
-        # Loop through all the runs and compute the data which has parameter value as the independent variable and tensors as the dependent value
-        for run in self._get_valid_runs():
-            tensor_events = self._multiplexer.Tensors(run, tag)
-            param_value = self._parameter_config[run].get(parameter, np.nan)
-            series_key_value = self._parameter_config[run].get(seriesKey, np.nan)
-
-            if not np.isnan(series_key_value):
-                # We want to return a dictionary which has a key for each series where the other parameters remain equal
-                param_key = "["+seriesKey+": "+str(series_key_value)+"]"
-                processed_events[param_key][param_value].append(self.aggregate_tensor_events(tensor_events, aggregation))
-        
-        # Aggregate the points so that there are only series which are keyed by the provided parameter name (seriesKey)
-        return {
-            param_key:  [
-                    (param_value, np.nanmean(np.array(processed_events[param_key][param_value])))
-                    for param_value in processed_events[param_key]
-                ]    
-                for param_key in processed_events
-            }
+            return aggregate.last_value
+
+    def _get_aggregate(self, run, tag, accumulator=None):
+        """Returns the aggregate of the tag of the run, or None if the run has been disabled or has no such tag"""
+        if accumulator is None:
+            try:
+                accumulator = self._multiplexer.GetAccumulator(run)
+            except KeyError:
+                return None
+        # Prefer the aggregates written while training by lib.aggregate_writer, which cover every step of the tag
+        try:
+            summary_events = accumulator.Tensors(aggregate_tag(tag))
+        except KeyError:
+            summary_events = None
+        if summary_events:
+            return self._aggregate_cache.get_summary(run, tag, accumulator, summary_events)
+        # Accumulators keeping exact aggregates (--paramplot_exact_aggregates) have seen every event of the tag
+        get_streaming_aggregate = getattr(accumulator, 'GetStreamingAggregate', None)
+        if get_streaming_aggregate is not None:
+            aggregate = get_streaming_aggregate(tag)
+            if aggregate is not None:
+                return aggregate
+        try:
+            tensor_events = accumulator.Tensors(tag)
+        except KeyError:
+            return None
+        return self._aggregate_cache.get(run, tag, accumulator, tensor_events)
+
+    def aggregate_tensor_events(self, run, tag, aggregation):
+        return self._aggregate_value(self._get_aggregate(run, tag), aggregation)
+
+    def _get_table(self):
+        # The table is rebuilt whenever the config is recomputed
+        if self._table is None:
+            self._table = ParameterTable(self._parameter_config)
+        return self._table
+
+    def _aggregate_rows(self, table, rows, tag_aggregations):
+        """Computes the metric of every requested (tag, aggregation) for each of the rows in a single pass over the runs.
+
+        Returns:
+          A dictionary mapping each (tag, aggregation) to an array of the metric of each row, which is NaN for the rows
+          whose run has been disabled or does not have the tag.
+        """
+        tags = sorted(set(tag for tag, _ in tag_aggregations))
+        metrics = {key: np.empty(len(rows), dtype=np.float64) for key in tag_aggregations}
+        for index, row in enumerate(rows):
+            run = table.runs[row]
+            try:
+                accumulator = self._multiplexer.GetAccumulator(run)
+            except KeyError:
+                # The run has been disabled since the table was built
+                for key in tag_aggregations:
+                    metrics[key][index] = np.nan
+                continue
+            # Each tag of the run is aggregated once, whichever aggregations and series keys it is requested with
+            aggregates = {tag: self._get_aggregate(run, tag, accumulator) for tag in tags}
+            for tag, aggregation in tag_aggregations:
+                metrics[(tag, aggregation)][index] = self._aggregate_value(aggregates[tag], aggregation)
+        return metrics
+
+    def _get_tensor_events_payload_by_key(self, table, rows, metrics, parameter, seriesKey):
+        # Only the runs which have a value for the series key are plotted
+        has_key = ~np.isnan(table.codes(seriesKey)[rows])
+        rows = rows[has_key]
+        metrics = metrics[has_key]
+
+        # Average the metric over the runs with the same series key and parameter values, one series per series key value
+        first_rows, inverse = table.group_by(rows, [seriesKey, parameter])
+        means = group_nanmeans(inverse, metrics, len(first_rows))
+        series_rows, series_groups = table.group_by(first_rows, [seriesKey])
+        for key_row, groups in zip(series_rows, split_groups(series_groups, len(series_rows))):
+            param_key = "["+seriesKey+": "+str(table.raw_value(key_row, seriesKey))+"]"
+            yield param_key, [(table.raw_value(first_rows[group], parameter), means[group]) for group in groups]
     
-    def _get_tensor_events_payload_no_key(self, parameter, tag, aggregation):
-        processed_events = collections.defaultdict(list)
+    def _get_tensor_events_payload_no_key(self, table, rows, metrics, parameter):
         excluded_parameters = [param for param in self.parameters if not (parameter == param)]
 
-        for run in self._get_valid_runs():
-            tensor_events = self._multiplexer.Tensors(run, tag)
-            param_value = self._parameter_config[run].get(parameter, np.nan)
-            param_key = "".join([f"[{p}: {self._parameter_config[run].get(p, np.nan)}]" for p in excluded_parameters])
-            processed_events[param_key].append((param_value, self.aggregate_tensor_events(tensor_events, aggregation)))
-        
-        return processed_events
+        # One series for each combination of the values of the other parameters
+        first_rows, inverse = table.group_by(rows, excluded_parameters)
+        for row, indices in zip(first_rows, split_groups(inverse, len(first_rows))):
+            param_key = "".join([f"[{p}: {table.raw_value(row, p)}]" for p in excluded_parameters])
+            yield param_key, [(table.raw_value(rows[index], parameter), metrics[index]) for index in indices]
     
-    def _get_tensor_events_payload_single_series(self, parameter, tag, aggregation):
-        processed_events = collections.defaultdict(list)
-        
-        for run in self._get_valid_runs():
-            tensor_events = self._multiplexer.Tensors(run, tag)
-            param_value = self._parameter_config[run].get(parameter, np.nan)
-            processed_events[param_value].append(self.aggregate_tensor_events(tensor_events, aggregation))
-        
-        return {"All": [(param_value, np.nanmean(np.array(tensors))) for param_value, tensors in processed_events.items()]}
+    def _get_tensor_events_payload_single_series(self, table, rows, metrics, parameter):
+        first_rows, inverse = table.group_by(rows, [parameter])
+        means = group_nanmeans(inverse, metrics, len(first_rows))
+        yield "All", [(table.raw_value(row, parameter), mean) for row, mean in zip(first_rows, means)]
+
+    def _get_tensor_events_payloads(self, queries):
+        """Answers a list of (tag, parameter, aggregation, seriesKey) queries, reading the tensors of each run once.
+
+        The metrics of every run are computed up front, but the series of each payload are only built as the payload
+        is iterated, so that a streamed response never holds more than one series at a time.
+
+        Returns:
+          A list with an iterator over the (series name, [(parameter value, metric)]) pairs of each query, in the order
+          of the queries.
+        """
+        table = self._get_table()
+        rows = table.rows(self._get_valid_runs())
+        metrics = self._aggregate_rows(table, rows, list(set((tag, aggregation) for tag, _, aggregation, _ in queries)))
+
+        payloads = []
+        for tag, parameter, aggregation, seriesKey in queries:
+            tag_metrics = metrics[(tag, aggregation)]
+            if seriesKey == "All":
+                payloads.append(self._get_tensor_events_payload_single_series(table, rows, tag_metrics, parameter))
+            elif seriesKey == "None":
+                payloads.append(self._get_tensor_events_payload_no_key(table, rows, tag_metrics, parameter))
+            else:
+                payloads.append(self._get_tensor_events_payload_by_key(table, rows, tag_metrics, parameter, seriesKey))
+        return payloads
+
+    @staticmethod
+    def _downsampling_options(values):
+        """Parses the optional bins, binstat and max_points fields of a query, raising a ValueError if they are invalid"""
+        bins = int(values.get('bins') or 0)
+        statistic = values.get('binstat') or MEAN
+        max_points = int(values.get('max_points') or 0)
+        if bins < 0 or max_points < 0:
+            raise ValueError('bins and max_points must not be negative')
+        if 0 < max_points < MIN_MAX_POINTS:
+            raise ValueError('max_points must be 0 (no downsampling) or at least %d' % MIN_MAX_POINTS)
+        if statistic not in BIN_STATISTICS:
+            raise ValueError('binstat must be one of %s' % ', '.join(BIN_STATISTICS))
+        return bins, statistic, max_points
+
+    def _respond_with_payloads(self, request, payloads, many):
+        # Streamed responses write each series (or binary frame) as it is built rather than building the whole
+        # response first
+        stream = request.values.get('stream') == 'true'
+        if accepts_binary(request):
+            response = respond_binary(request, encode_binary_payloads(payloads), stream)
+        elif stream:
+            response = respond_streaming_json(request, iter_json_payloads(payloads, many))
+        else:
+            payloads = [dict(payload) for payload in payloads]
+            response = http_util.Respond(request, payloads if many else payloads[0], 'application/json')
+        return self._reloader.add_snapshot_age_header(response)
 
     @wrappers.Request.application
     def _paramdatabytag_route(self, request):
         """A route which returns the runparams for a particular run along with the tag specific data
 
+        Pass stream=true to have the response streamed (and gzipped if the client accepts it), or accept
+        application/x-paramplot-series to have the series sent as float64 arrays (see encode_binary_payloads).
+
+        Series with numeric parameter values can be reduced on the server: bins averages (or with binstat=min/max
+        takes the min/max of) the metrics in that many equal width bins of the parameter, and max_points downsamples
+        each series to at most that many points with LTTB.
+
         Returns:
           A JSON object of the form:
           [(wall_time, parameter_value, tag_value)] for each run
@@ -189,17 +324,41 @@ class ParamPlotPlugin(base_plugin.TBPlugin):
         tag = request.args.get('tag')
         aggregation = request.args.get('aggregation')
         seriesKey = request.args.get('serieskey')
+        try:
+            downsampling = self._downsampling_options(request.args)
+        except ValueError as e:
+            return http_util.Respond(request, 'Invalid downsampling: %s' % e, 'text/plain', code=400)
 
-        self._multiplexer.Reload()
+        self._reloader.request_snapshot()
 
-        if seriesKey == "All":
-            response = self._get_tensor_events_payload_single_series(parameter, tag, aggregation)
-        elif seriesKey == "None":
-            response = self._get_tensor_events_payload_no_key(parameter, tag, aggregation)
-        else:
-            response = self._get_tensor_events_payload_by_key(parameter, tag, aggregation, seriesKey)
+        payload = self._get_tensor_events_payloads([(tag, parameter, aggregation, seriesKey)])[0]
+        return self._respond_with_payloads(request, [downsample_payload(payload, *downsampling)], False)
 
-        return http_util.Respond(request, response, 'application/json')
+    @wrappers.Request.application
+    def _paramdatabytags_route(self, request):
+        """A route which answers the queries of many charts at once, reading the tensors of each run only once.
+
+        The queries are a JSON array of objects with the same tag, parameter, aggregation and serieskey (and optional
+        bins, binstat and max_points) fields as the /paramdatabytag route, passed in the requests field of a POSTed
+        form (or of the query string for a few queries). Pass stream=true to have the response streamed (and gzipped
+        if the client accepts it), or accept application/x-paramplot-series to have the series sent as float64 arrays.
+        A query for a tag which a run does not have gets a NaN metric for that run.
+
+        Returns:
+          A JSON array of the /paramdatabytag payload of each query, in the order of the queries
+        """
+        try:
+            requests = json.loads(request.values.get('requests', '[]'))
+            queries = [(query['tag'], query['parameter'], query.get('aggregation'), query['serieskey']) for query in requests]
+            downsampling = [self._downsampling_options(query) for query in requests]
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            return http_util.Respond(request, 'Invalid requests: %s' % e, 'text/plain', code=400)
+
+        self._reloader.request_snapshot()
+
+        payloads = [downsample_payload(payload, *options)
+                    for payload, options in zip(self._get_tensor_events_payloads(queries), downsampling)]
+        return self._respond_with_payloads(request, payloads, True)
 
     @wrappers.Request.application
     def _parameters_route(self, request):
@@ -214,3 +373,21 @@ class ParamPlotPlugin(base_plugin.TBPlugin):
         }
 
         return http_util.Respond(request, response, 'application/json')
+
+    @wrappers.Request.application
+    def _cachestats_route(self, request):
+        """A route which returns the hit, miss and eviction counts of the caches the plugin reads through, for sizing
+        --tensor_cache_mb
+
+        Returns: A JSON object with the stats of the decoded tensor cache and the aggregate cache
+        """
+        response = {
+            "tensor_cache": self._tensor_cache.stats(),
+            "aggregate_cache": {
+                "entries": len(self._aggregate_cache),
+                "hits": self._aggregate_cache.hits,
+                "misses": self._aggregate_cache.misses,
+            },
+        }
+
+        return http_util.Respond(request, response, 'application/json')
@@ -0,0 +1,122 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import numbers
+import struct
+import zlib
+
+import numpy as np
+from werkzeug import wrappers
+
+from tensorboard.backend import json_util
+
+BINARY_CONTENT_TYPE = 'application/x-paramplot-series'
+
+# The compressed output is flushed to the wire whenever at least this many bytes of JSON have been written
+_FLUSH_BYTES = 64 * 1024
+
+
+def _iter_json_payload(payload):
+    # Writes a payload of (series name, points) pairs as a JSON object, one series at a time
+    yield '{'
+    for index, (name, points) in enumerate(payload):
+        # Cleanse turns NaN and infinite metrics into strings as http_util.Respond does
+        yield '%s%s: %s' % (',' if index else '', json.dumps(name), json.dumps(json_util.Cleanse(points)))
+    yield '}'
+
+
+def iter_json_payloads(payloads, many):
+    """Iterates over the JSON of the payloads as it is built.
+
+    Args:
+      payloads: A list of iterators over the (series name, points) pairs of each payload.
+      many: Whether to write a JSON array of the payloads, rather than the only payload.
+    """
+    if not many:
+        for chunk in _iter_json_payload(payloads[0]):
+            yield chunk
+        return
+    yield '['
+    for index, payload in enumerate(payloads):
+        if index:
+            yield ','
+        for chunk in _iter_json_payload(payload):
+            yield chunk
+    yield ']'
+
+
+def _iter_gzip(chunks):
+    # gzip framing (wbits of 16 + 15) so that the stream can be sent with Content-Encoding: gzip
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pending = 0
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        pending += len(chunk)
+        if pending >= _FLUSH_BYTES:
+            # Without a sync flush zlib may hold on to the whole response until the end
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _respond_streaming(request, body, content_type, vary):
+    # Writes the chunks of bytes to the client as they are produced, gzipped if the client accepts it
+    headers = [('X-Content-Type-Options', 'nosniff'), ('Vary', vary)]
+    if 'gzip' in request.accept_encodings:
+        body = _iter_gzip(body)
+        headers.append(('Content-Encoding', 'gzip'))
+    return wrappers.Response(body, headers=headers, content_type=content_type, direct_passthrough=True)
+
+
+def respond_streaming_json(request, chunks):
+    """Returns a response which writes the JSON chunks to the client as they are produced, gzipped if the client
+    accepts it, so that the whole response body is never held in memory."""
+    return _respond_streaming(request, (chunk.encode('utf-8') for chunk in chunks), 'application/json',
+                              'Accept-Encoding')
+
+
+def accepts_binary(request):
+    """Whether the client prefers the binary encoding to JSON. Clients have to ask for it explicitly, as */* accepts
+    both equally."""
+    return request.accept_mimetypes[BINARY_CONTENT_TYPE] > request.accept_mimetypes['application/json']
+
+
+def encode_binary_payloads(payloads):
+    """Iterates over the frames of the payloads, each a JSON header followed by the values of every series of the
+    payload as contiguous float64 arrays. A frame is only built once the previous one has been written.
+
+    Each frame starts with the little endian uint32 length of its header, then the UTF-8 JSON header padded with
+    spaces to a multiple of 8 bytes, so that the arrays which follow (and so the next frame) are aligned. The header
+    lists the name and length of each series of the payload, in the order their arrays appear. Each series has an
+    array of its x values followed by an array of its metrics, unless its x values are not all numbers, in which case
+    they are given in the header instead.
+    """
+    for payload in payloads:
+        header = []
+        arrays = []
+        for name, points in payload:
+            x_values = [point[0] for point in points]
+            series_header = {'name': name, 'length': len(points)}
+            if all(isinstance(x, numbers.Real) and not isinstance(x, bool) for x in x_values):
+                arrays.append(np.array(x_values, dtype='<f8'))
+            else:
+                series_header['x'] = x_values
+            arrays.append(np.array([point[1] for point in points], dtype='<f8'))
+            header.append(series_header)
+
+        header_bytes = json.dumps(json_util.Cleanse(header)).encode('utf-8')
+        header_bytes += b' ' * (-(4 + len(header_bytes)) % 8)
+        yield b''.join([struct.pack('<I', len(header_bytes)), header_bytes] + [array.tobytes() for array in arrays])
+
+
+def respond_binary(request, frames, stream=False):
+    """Returns a response of the frames of encode_binary_payloads, which are streamed (and gzipped if the client
+    accepts it) in the same way as JSON if stream is set"""
+    if stream:
+        return _respond_streaming(request, frames, BINARY_CONTENT_TYPE, 'Accept, Accept-Encoding')
+    headers = [('X-Content-Type-Options', 'nosniff'), ('Vary', 'Accept')]
+    return wrappers.Response(b''.join(frames), headers=headers, content_type=BINARY_CONTENT_TYPE)
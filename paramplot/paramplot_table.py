@@ -0,0 +1,104 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import numbers
+
+import numpy as np
+
+
+class ParameterColumn:
+    """The values of a single parameter for every run in a ParameterTable.
+
+    Numeric parameters are held as float64 values. Any other parameter (e.g. the name of an optimiser) is held as
+    categorical codes into categories. Either way a run without the parameter has the value NaN.
+    """
+    def __init__(self, values, categories=None):
+        self.values = values
+        self.categories = categories
+
+
+class ParameterTable:
+    """A columnar copy of the runparams of every run, with one NumPy array per parameter.
+
+    Grouping runs by the values of some of their parameters is then a single np.unique over the stacked columns
+    rather than building a key for every run.
+    """
+    def __init__(self, parameter_config):
+        self.runs = list(parameter_config.keys())
+        self._configs = [parameter_config[run] for run in self.runs]
+        self._rows = {run: row for row, run in enumerate(self.runs)}
+        names = set()
+        for config in self._configs:
+            names.update(config.keys())
+        self.columns = {name: self._build_column(name) for name in names}
+        self._missing = np.full(len(self.runs), np.nan)
+
+    def _build_column(self, name):
+        raw_values = [config.get(name) for config in self._configs]
+        present = [value for value in raw_values if value is not None]
+        if all(isinstance(value, numbers.Real) and not isinstance(value, bool) for value in present):
+            return ParameterColumn(np.array([np.nan if value is None else value for value in raw_values], dtype=np.float64))
+
+        codes = np.full(len(raw_values), np.nan)
+        categories = []
+        category_codes = {}
+        for row, value in enumerate(raw_values):
+            if value is None:
+                continue
+            # json.dumps gives a hashable key for lists and dicts and keeps 1 and "1" apart
+            key = json.dumps(value, sort_keys=True)
+            if key not in category_codes:
+                category_codes[key] = len(categories)
+                categories.append(value)
+            codes[row] = category_codes[key]
+        return ParameterColumn(codes, categories)
+
+    def __len__(self):
+        return len(self.runs)
+
+    def rows(self, runs):
+        """Returns the rows of the runs as an index array"""
+        return np.fromiter((self._rows[run] for run in runs), dtype=np.int64, count=len(runs))
+
+    def codes(self, name):
+        """Returns the (numeric or categorical) values of the parameter for every run, NaN where it is missing"""
+        column = self.columns.get(name)
+        return column.values if column is not None else self._missing
+
+    def raw_value(self, row, name):
+        """Returns the value of the parameter for the run as it appeared in its runparams.json"""
+        return self._configs[row].get(name, np.nan)
+
+    def group_by(self, rows, names):
+        """Groups the rows by their values of the named parameters, with a missing value grouping like any other value.
+
+        Returns:
+          A tuple of the first row of each group, and the index of the group of each row.
+        """
+        if len(rows) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        if not names:
+            return rows[:1], np.zeros(len(rows), dtype=np.int64)
+        keys = np.column_stack([self.codes(name)[rows] for name in names])
+        # NaN never compares equal to itself, so split each key into its value (zeroed where missing) and a missing flag
+        missing = np.isnan(keys)
+        keys = np.concatenate([np.where(missing, 0.0, keys), missing.astype(np.float64)], axis=1)
+        _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        return rows[first], inverse.reshape(-1)
+
+
+def group_nanmeans(inverse, values, num_groups):
+    """Returns the mean of the values in each group, ignoring NaN values (like np.nanmean)"""
+    valid = ~np.isnan(values)
+    sums = np.bincount(inverse[valid], weights=values[valid], minlength=num_groups)
+    counts = np.bincount(inverse[valid], minlength=num_groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+
+def split_groups(inverse, num_groups):
+    """Returns, for each group, the indices of the values in the group in their original order"""
+    order = np.argsort(inverse, kind='stable')
+    return np.split(order, np.cumsum(np.bincount(inverse, minlength=num_groups))[:-1])
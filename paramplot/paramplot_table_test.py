@@ -0,0 +1,76 @@
+import numpy as np
+
+from gr_tensorboard.paramplot.paramplot_table import ParameterTable, group_nanmeans, split_groups
+
+PARAMETER_CONFIG = {
+    'run0': {'lr': 0.1, 'optimiser': 'adam', 'layers': [64, 64]},
+    'run1': {'lr': 0.01, 'optimiser': 'sgd', 'layers': [64, 64]},
+    'run2': {'lr': 0.1, 'optimiser': 'adam', 'layers': [128]},
+    'run3': {'lr': 0.1, 'optimiser': 'adam'},
+    'run4': {'optimiser': 'sgd', 'layers': [64, 64]},
+}
+
+def _groups(table, runs, names):
+    # the runs of each group, ordered by the first run of the group
+    first, inverse = table.group_by(table.rows(runs), names)
+    groups = [[run for run, group in zip(runs, inverse) if group == index] for index in range(len(first))]
+    assert [table.runs[row] for row in first] == [group[0] for group in groups]
+    return sorted(groups)
+
+def test_columns():
+    table = ParameterTable(PARAMETER_CONFIG)
+    assert len(table) == 5
+    np.testing.assert_array_equal(table.codes('lr'), [0.1, 0.01, 0.1, 0.1, np.nan])
+    assert table.columns['lr'].categories is None
+    np.testing.assert_array_equal(table.codes('optimiser'), [0, 1, 0, 0, 1])
+    assert table.columns['optimiser'].categories == ['adam', 'sgd']
+    np.testing.assert_array_equal(table.codes('layers'), [0, 0, 1, np.nan, 0])
+    assert table.columns['layers'].categories == [[64, 64], [128]]
+    assert np.isnan(table.codes('missing')).all()
+
+def test_mixed_and_boolean_values_are_categorical():
+    table = ParameterTable({'run0': {'a': 1, 'b': True}, 'run1': {'a': '1', 'b': False}, 'run2': {'a': 1}})
+    # 1 and "1" are different categories
+    np.testing.assert_array_equal(table.codes('a'), [0, 1, 0])
+    np.testing.assert_array_equal(table.codes('b'), [0, 1, np.nan])
+    assert table.columns['b'].categories == [True, False]
+
+def test_raw_value():
+    table = ParameterTable(PARAMETER_CONFIG)
+    row = table.rows(['run2'])[0]
+    assert table.raw_value(row, 'layers') == [128]
+    assert np.isnan(table.raw_value(row, 'missing'))
+
+def test_group_by():
+    table = ParameterTable(PARAMETER_CONFIG)
+    runs = sorted(PARAMETER_CONFIG)
+    assert _groups(table, runs, ['optimiser']) == [['run0', 'run2', 'run3'], ['run1', 'run4']]
+    assert _groups(table, runs, ['optimiser', 'lr']) == [['run0', 'run2', 'run3'], ['run1'], ['run4']]
+    assert _groups(table, runs, ['lr', 'layers']) == [['run0'], ['run1'], ['run2'], ['run3'], ['run4']]
+
+def test_group_by_missing_values_group_together():
+    table = ParameterTable({'run0': {'lr': 0.0}, 'run1': {}, 'run2': {'lr': 0.0}, 'run3': {'seed': 1}})
+    # a missing value must not be confused with the value 0
+    assert _groups(table, ['run0', 'run1', 'run2', 'run3'], ['lr']) == [['run0', 'run2'], ['run1', 'run3']]
+
+def test_group_by_subset_of_rows():
+    table = ParameterTable(PARAMETER_CONFIG)
+    assert _groups(table, ['run4', 'run1'], ['optimiser']) == [['run4', 'run1']]
+
+def test_group_by_no_names_or_rows():
+    table = ParameterTable(PARAMETER_CONFIG)
+    first, inverse = table.group_by(table.rows(['run3', 'run1']), [])
+    np.testing.assert_array_equal(first, table.rows(['run3']))
+    np.testing.assert_array_equal(inverse, [0, 0])
+
+    first, inverse = table.group_by(table.rows([]), ['lr'])
+    assert len(first) == 0 and len(inverse) == 0
+
+def test_group_nanmeans():
+    inverse = np.array([0, 1, 0, 2, 1])
+    values = np.array([1.0, np.nan, 3.0, np.nan, 5.0])
+    np.testing.assert_array_equal(group_nanmeans(inverse, values, 4), [2.0, 5.0, np.nan, np.nan])
+
+def test_split_groups():
+    groups = split_groups(np.array([1, 0, 1, 2, 0]), 4)
+    assert [group.tolist() for group in groups] == [[1, 4], [0, 2], [3], []]
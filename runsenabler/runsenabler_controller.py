@@ -1,9 +1,129 @@
-from tensorboard.backend.event_processing import plugin_event_accumulator as event_accumulator
+import concurrent.futures
+import errno
 import os
 import shutil
 import pathlib
+import threading
+
+from gr_tensorboard.backend import io_helpers
+from gr_tensorboard.backend.accumulators import create_accumulator
+from gr_tensorboard.backend.logging import get_logger
+from gr_tensorboard.backend.metrics import get_metrics
+from gr_tensorboard.backend.tensor_cache import get_tensor_cache
+from .runsenabler_profiler import propagate_track
+
+COPY = 'copy'
+HARDLINK = 'hardlink'
+REFLINK = 'reflink'
+SYMLINK = 'symlink'
+LINK_MODES = [COPY, HARDLINK, REFLINK, SYMLINK]
+
+# ioctl request number of FICLONE from <linux/fs.h>
+_FICLONE = 0x40049409
+
+_logger = get_logger()
+
+_runs_enabled = get_metrics().counter('grtensorboard_runs_enabled_total',
+                                      'The runs whose accumulators have been added to the multiplexer')
+_runs_disabled = get_metrics().counter('grtensorboard_runs_disabled_total',
+                                       'The runs whose accumulators have been removed from the multiplexer')
+bytes_copied_metric = get_metrics().counter('grtensorboard_run_bytes_copied_total',
+                                            'The bytes of run data copied into the temporary logdir, by what copied them',
+                                            ('source',))
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, 'rb') as src_handle, open(dst, 'wb') as dst_handle:
+        try:
+            fcntl.ioctl(dst_handle.fileno(), _FICLONE, src_handle.fileno())
+        except OSError:
+            dst_handle.close()
+            os.remove(dst)
+            raise
+
+def link_file(src, dst_dir, mode):
+    """Makes the file src available in dst_dir using the given link mode, falling back to the next cheapest mode
+    which works (e.g. a hardlink across filesystems becomes a symlink).
+
+    Hardlinks and symlinks share the data of the original file so events which are appended to it remain visible,
+    whereas a reflink (on filesystems which support it, such as btrfs and xfs) is a copy-on-write snapshot.
+
+    Returns: The link mode which was used
+    """
+    dst = os.path.join(dst_dir, os.path.basename(src))
+    if mode == HARDLINK:
+        try:
+            os.link(src, dst)
+            return HARDLINK
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            mode = SYMLINK
+    if mode == REFLINK:
+        try:
+            _reflink(src, dst)
+            return REFLINK
+        except (OSError, ImportError):
+            mode = COPY
+    if mode == SYMLINK:
+        os.symlink(os.path.abspath(src), dst)
+        return SYMLINK
+    shutil.copy(src, dst)
+    return COPY
 
 class RunsController:
+    """Enables and disables runs. The batch methods return a dictionary mapping each run which failed to its error."""
+    def __init__(self, max_workers=1):
+        self.max_workers = max_workers
+        self._executor = None
+        # The number of bytes of run data which have been copied when enabling runs
+        self.bytes_copied = 0
+        self._bytes_copied_lock = threading.Lock()
+        # Optional RunStateStore to which the enabled runs are saved whenever they change
+        self.state_store = None
+
+    def _add_bytes_copied(self, num_bytes):
+        with self._bytes_copied_lock:
+            self.bytes_copied += num_bytes
+        bytes_copied_metric.inc(num_bytes, source='enable')
+
+    def _map_runs(self, func, runs):
+        # Applies func to each of the runs, concurrently when there is more than one worker
+        failures = {}
+        # The workers are profiled under the same label as the job (or route) which the runs are mapped for
+        func = propagate_track(func)
+        if self.max_workers <= 1 or len(runs) <= 1:
+            for run in runs:
+                try:
+                    func(run)
+                except Exception as e:
+                    failures[run] = str(e)
+            return failures
+
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = {self._executor.submit(func, run): run for run in runs}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failures[futures[future]] = str(e)
+        return failures
+
+    def enabled_runs(self):
+        """Returns a dictionary mapping each enabled run to the state of its files, which is saved by save_state"""
+        raise NotImplementedError
+
+    def save_state(self):
+        if self.state_store is not None:
+            self.state_store.save(self.enabled_runs())
+
+    def restore(self, runs):
+        """Enables the runs saved by a previous process, returning the failures"""
+        failures = self.enable_runs([run for run in runs if os.path.isdir(os.path.join(str(self.logdir), run))])
+        self.save_state()
+        return failures
+
     def enable_run(self, run):
         raise NotImplementedError
     def disable_run(self, run):
@@ -14,73 +134,160 @@ class RunsController:
         raise NotImplementedError
 
 class EventMultiplexerRunsController(RunsController):
-    def __init__(self, multiplexer, logdir):
-        super(EventMultiplexerRunsController, self).__init__()
+    def __init__(self, multiplexer, logdir, max_workers=1):
+        super(EventMultiplexerRunsController, self).__init__(max_workers)
         self._multiplexer = multiplexer
         self.logdir = logdir
 
+    def enabled_runs(self):
+        with self._multiplexer._accumulators_mutex:
+            return {run: {} for run in self._multiplexer._accumulators}
+
     def enable_run(self, run):
         run_path = os.path.join(self.logdir, run)
         self._multiplexer.AddRun(run_path, run)
+        _runs_enabled.inc()
+        self.save_state()
     
+    def _forget_run(self, run):
+        # The decoded series of a disabled run will never be asked for again, nor should it be loaded lazily
+        get_tensor_cache().evict_run(run)
+        lazy_loader = getattr(self._multiplexer, 'lazy_loader', None)
+        if lazy_loader is not None:
+            lazy_loader.forget(run)
+
     def disable_run(self, run):
         with self._multiplexer._accumulators_mutex:
             if run in self._multiplexer._accumulators:
                 del self._multiplexer._accumulators[run]
+        self._forget_run(run)
+        _runs_disabled.inc()
+        self.save_state()
     
+    def _create_accumulator(self, run):
+        self._multiplexer._accumulators[run] = create_accumulator(self._multiplexer, os.path.join(self.logdir, run))
+        self._multiplexer._paths[run] = os.path.join(self.logdir, run)
+
     def enable_runs(self, runs):
-        for run in runs:
-            self._multiplexer._accumulators[run] = event_accumulator.EventAccumulator(
-                os.path.join(self.logdir, run),
-                size_guidance=self._multiplexer._size_guidance,
-                tensor_size_guidance=self._multiplexer._tensor_size_guidance,
-                purge_orphaned_data=self._multiplexer.purge_orphaned_data)
-            self._multiplexer._paths[run] = os.path.join(self.logdir, run)
+        failures = self._map_runs(self._create_accumulator, runs)
+        _runs_enabled.inc(len(runs) - len(failures))
+        self.save_state()
+        return failures
     
     def disable_runs(self, runs):
+        # Only the multiplexer's dictionaries are changed under its lock, so that readers of the multiplexer are not
+        # held up by anything else done to disable the runs (e.g. removing their files from the temporary logdir)
+        with self._multiplexer._accumulators_mutex:
+            for run in runs:
+                self._multiplexer._accumulators.pop(run, None)
+                self._multiplexer._paths.pop(run, None)
         for run in runs:
-            if run in self._multiplexer._accumulators:
-                del self._multiplexer._accumulators[run]
-            if run in self._multiplexer._paths:
-                del self._multiplexer._paths[run]
+            self._forget_run(run)
+        _runs_disabled.inc(len(runs))
+        self.save_state()
+        return {}
 
 class FilesystemRunsController(RunsController):
-    def __init__(self, actual_logdir, base_controller):
-        super(FilesystemRunsController, self).__init__()
+    def __init__(self, actual_logdir, base_controller, link_mode=COPY, syncer=None, max_workers=1):
+        super(FilesystemRunsController, self).__init__(max_workers)
         # This would have been set on startup to be the new logdir
         self.temp_logdir = pathlib.Path(base_controller.logdir)
         self.logdir = pathlib.Path(actual_logdir)
         self.base_controller = base_controller
+        self.link_mode = link_mode
+        # Optional TailSyncer which keeps the files of enabled runs up to date with the originals
+        self.syncer = syncer
+        # The runs whose files are in the temporary logdir
+        self._enabled = set()
+        self._enabled_lock = threading.Lock()
+
+    def enabled_runs(self):
+        with self._enabled_lock:
+            runs = list(self._enabled)
+        files = self.syncer.run_files() if self.syncer is not None else {}
+        return {run: files.get(run, {}) for run in runs}
+
+    def restore(self, runs):
+        """Reuses the temporary logdir left behind by a previous process which saved the given {run: files}.
+
+        Runs whose directories survive in the temporary logdir are enabled without being copied again, and the syncer
+        carries on from the files it had copied. Saved runs whose directories are missing are copied again, while
+        directories of runs which were not saved (e.g. because the process died while copying them) are removed.
+        """
+        runs = {run: files for run, files in runs.items() if (self.logdir / run).is_dir()}
+        kept = [run for run in runs if (self.temp_logdir / run).is_dir()]
+        for run in io_helpers.get_run_names(str(self.temp_logdir)):
+            if run not in runs:
+                shutil.rmtree(str(self.temp_logdir / run), ignore_errors=True)
+
+        failures = self.base_controller.enable_runs(kept)
+        with self._enabled_lock:
+            self._enabled.update(run for run in kept if run not in failures)
+        if self.syncer is not None:
+            for run in kept:
+                if run not in failures:
+                    self.syncer.restore_run(run, runs[run])
+        failures.update(self.enable_runs([run for run in runs if run not in kept]))
+        self.save_state()
+        return failures
 
     def _enable_run(self, run):
         # copy the events file and run directory from the logdir to the temp dir
         old_run_path = self.logdir / run
         new_run_path = self.temp_logdir / run
-        print("making run directory: " + str(new_run_path))
+        _logger.info("making run directory: " + str(new_run_path))
         new_run_path.mkdir(parents=True)
-        for events_file in old_run_path.glob("events.out.tfevents.*"):
-            shutil.copy(str(events_file), str(new_run_path))
-        for metadata_file in old_run_path.glob("*.json"):
-            shutil.copy(str(metadata_file), str(new_run_path))
+        try:
+            # The events files are copied in the order the accumulator reads them
+            files = sorted(io_helpers.get_events_files(self.logdir, run)) + [str(path) for path in old_run_path.glob("*.json")]
+            for run_file in files:
+                if link_file(run_file, str(new_run_path), self.link_mode) == COPY:
+                    self._add_bytes_copied(os.path.getsize(run_file))
+        except Exception:
+            # Don't leave a half copied run behind
+            shutil.rmtree(str(new_run_path), ignore_errors=True)
+            raise
+        if self.syncer is not None:
+            self.syncer.add_run(run)
+        with self._enabled_lock:
+            self._enabled.add(run)
 
     def enable_run(self, run):
-        self.base_controller.enable_run(run)
+        # The accumulator is only created once the files are in place, so that a reload never reads a half copied run
         self._enable_run(run)
+        try:
+            self.base_controller.enable_run(run)
+        except Exception:
+            self._disable_run(run)
+            raise
+        self.save_state()
     
     def _disable_run(self, run):
+        if self.syncer is not None:
+            self.syncer.remove_run(run)
+        with self._enabled_lock:
+            self._enabled.discard(run)
         run_path = self.temp_logdir / run
         shutil.rmtree(str(run_path))
 
     def disable_run(self, run):
         self.base_controller.disable_run(run)
         self._disable_run(run)
+        self.save_state()
     
     def enable_runs(self, runs):
-        self.base_controller.enable_runs(runs)
-        for run in runs:
-            self._enable_run(run)
+        # The accumulators are only created once the files of their runs are in place, so that a reload never reads a
+        # half copied run. A run which fails to copy has already had its files removed by _enable_run.
+        failures = self._map_runs(self._enable_run, runs)
+        accumulator_failures = self.base_controller.enable_runs([run for run in runs if run not in failures])
+        # Don't leave the files behind for runs whose accumulators could not be created
+        self._map_runs(self._disable_run, list(accumulator_failures))
+        failures.update(accumulator_failures)
+        self.save_state()
+        return failures
     
     def disable_runs(self, runs):
-        self.base_controller.disable_runs(runs)
-        for run in runs:
-            self._disable_run(run)
\ No newline at end of file
+        failures = self.base_controller.disable_runs(runs)
+        failures.update(self._map_runs(self._disable_run, runs))
+        self.save_state()
+        return failures
\ No newline at end of file
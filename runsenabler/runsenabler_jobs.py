@@ -0,0 +1,185 @@
+import collections
+import itertools
+import threading
+import time
+import concurrent.futures
+
+from .runsenabler_profiler import NoOpTimer
+
+# The number of runs handed to the controller at a time, between which progress is reported and cancellation checked
+_CHUNK_RUNS = 32
+
+ENABLE = 'enable'
+DISABLE = 'disable'
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+class Job:
+    """A bulk enable or disable of runs which is carried out in the background"""
+    def __init__(self, job_id, action, runs, description):
+        self.id = job_id
+        self.action = action
+        self.description = description
+        self.state = PENDING
+        # Runs which are yet to be processed - runs may be taken out of here by later jobs which supersede them
+        self.remaining = collections.OrderedDict((run, None) for run in runs)
+        self.runs_done = 0
+        self.runs_skipped = 0
+        self.failed = {}
+        self.bytes_copied = 0
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    @property
+    def is_finished(self):
+        return self.state in (DONE, CANCELLED, FAILED)
+
+    def to_dict(self):
+        end = self.finished if self.finished is not None else time.time()
+        return {
+            "id": self.id,
+            "action": self.action,
+            "description": self.description,
+            "state": self.state,
+            "runs_done": self.runs_done,
+            "runs_remaining": len(self.remaining),
+            "runs_skipped": self.runs_skipped,
+            "failed": dict(self.failed),
+            "bytes_copied": self.bytes_copied,
+            "elapsed": end - self.started if self.started is not None else 0.0,
+            "error": self.error,
+        }
+
+class JobManager:
+    """Runs bulk enable and disable jobs one at a time on a background thread.
+
+    Jobs are coalesced: when a job is submitted, its runs are taken out of every job which has not yet processed them,
+    as the later request supersedes the earlier one. Toggling a group of runs on and off again before the first job
+    gets to them therefore does no I/O at all. When a job comes to process a run which is already in the state it
+    wants (e.g. enabling an enabled run) the run is skipped.
+    """
+    def __init__(self, controller, multiplexer, logger, max_finished_jobs=100, sampler=None):
+        self.controller = controller
+        self._multiplexer = multiplexer
+        self.logger = logger
+        # Optional SamplingProfiler which profiles the jobs as they run
+        self._sampler = sampler
+        self._jobs = collections.OrderedDict()
+        self._max_finished_jobs = max_finished_jobs
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def submit(self, action, runs, description=''):
+        """Queues a job to enable or disable the runs, returning the job"""
+        with self._lock:
+            job = Job(next(self._ids), action, runs, description)
+            self._supersede(runs)
+            self._jobs[job.id] = job
+            self._prune()
+        self._executor.submit(self._run_job, job)
+        return job
+
+    def _supersede(self, runs):
+        for job in self._jobs.values():
+            if job.is_finished:
+                continue
+            for run in runs:
+                job.remaining.pop(run, None)
+            if job.state == PENDING and not job.remaining:
+                job.state = CANCELLED
+                job.finished = time.time()
+
+    def supersede(self, runs):
+        """Takes the runs out of every unfinished job, e.g. because they have just been enabled or disabled directly"""
+        with self._lock:
+            self._supersede(runs)
+
+    def cancel(self, job_id):
+        """Cancels a job - a running job stops after the runs which it is currently processing"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.is_finished:
+                return job
+            if job.state == PENDING:
+                job.finished = time.time()
+            job.state = CANCELLED
+            return job
+
+    def describe(self, job_id):
+        """Returns the progress of the job as a dictionary, or None if there is no such job"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job is not None else None
+
+    def describe_all(self):
+        with self._lock:
+            return [job.to_dict() for job in self._jobs.values()]
+
+    def num_active(self):
+        """The number of jobs which have not finished"""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.is_finished)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+        for job_id in finished[:max(0, len(finished) - self._max_finished_jobs)]:
+            del self._jobs[job_id]
+
+    def _next_chunk(self, job):
+        # Takes the next chunk of runs out of the job, dropping those which are already in the wanted state
+        with self._lock:
+            if job.state != RUNNING:
+                return []
+            chunk = []
+            while job.remaining and len(chunk) < _CHUNK_RUNS:
+                run, _ = job.remaining.popitem(last=False)
+                if (run in self._multiplexer._accumulators) == (job.action == ENABLE):
+                    job.runs_skipped += 1
+                else:
+                    chunk.append(run)
+            return chunk
+
+    def _process_chunk(self, job, chunk):
+        bytes_before = self.controller.bytes_copied
+        if job.action == ENABLE:
+            failures = self.controller.enable_runs(chunk)
+        else:
+            failures = self.controller.disable_runs(chunk)
+        for run, error in failures.items():
+            self.logger.log_message_info("job %d failed to %s run %s: %s" % (job.id, job.action, run, error))
+        with self._lock:
+            job.failed.update(failures)
+            job.runs_done += len(chunk)
+            # Jobs run one at a time so the controller's byte count only moves for this job
+            job.bytes_copied += self.controller.bytes_copied - bytes_before
+
+    def _run_job(self, job):
+        with self._lock:
+            if job.state != PENDING:
+                return
+            job.state = RUNNING
+            job.started = time.time()
+        self.logger.log_message_info("starting job %d: %s %d runs (%s)" % (job.id, job.action, len(job.remaining), job.description))
+        try:
+            with self._sampler.track('job ' + job.action) if self._sampler is not None else NoOpTimer():
+                while True:
+                    chunk = self._next_chunk(job)
+                    if not chunk:
+                        break
+                    self._process_chunk(job, chunk)
+        except Exception as e:
+            with self._lock:
+                job.state = FAILED
+                job.error = str(e)
+        with self._lock:
+            if job.state == RUNNING:
+                job.state = DONE
+            job.finished = time.time()
+        self.logger.log_message_info("finished job %d: %s" % (job.id, job.to_dict()))
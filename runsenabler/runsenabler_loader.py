@@ -1,15 +1,32 @@
+import os
+
 from tensorboard.plugins import base_plugin
 from .runsenabler_plugin import RunsEnablerPlugin
 
-from .runsenabler_controller import EventMultiplexerRunsController, FilesystemRunsController
+from gr_tensorboard.backend.accumulator_snapshots import restore_snapshots, save_snapshots
+from gr_tensorboard.backend.logging import get_logger
+from .runsenabler_controller import EventMultiplexerRunsController, FilesystemRunsController, LINK_MODES, COPY
+from .runsenabler_state import RunStateStore, STATE_FILE_NAME, SNAPSHOTS_DIR_NAME
+from .runsenabler_sync import TailSyncer
+
+_logger = get_logger()
 
 class RunsEnablerLoader(base_plugin.TBLoader):
     def __init__(self, logdir):
         self._plugin_class = RunsEnablerPlugin
         self.actual_logdir = logdir
+        # Set by load when the temporary logdir is kept for the next start
+        self._controller = None
+        self._multiplexer = None
+        self._snapshots_dir = None
     
     def define_flags(self, parser):
-        group = parser.add_argument_group('runsenabler plugin')
+        group = parser.add_argument_group('runsenabler plugin', description='''\
+            Under the gr backend (main.py) the stock reload thread does not run, and --reload_interval instead drives the \
+            reload coordinator shared by every plugin. It reloads in the background every interval (or when runs are \
+            enabled) and skips runs whose events files are unchanged. An interval of 0 or less reloads the changed runs \
+            whenever a plugin route asks for data instead.\
+            ''')
         group.add_argument('--default_runs_regex', metavar='REGEX', type=str, default='', help='''\
             Specifies the regex by which to initialise the tensorboard runsenabler frontend with - no runs will be enabled by default but can be selected in the runsnenabler\
             ''')
@@ -17,10 +34,139 @@ class RunsEnablerLoader(base_plugin.TBLoader):
             Determines whether runsenabler will write stats to disk.\
             ''', action='store_true')
         group.add_argument("--use_filesystem_controller", default=True, action='store_true')
+        group.add_argument('--run_link_mode', choices=LINK_MODES, default=COPY, help='''\
+            How the filesystem controller makes the files of an enabled run available in the temporary logdir. hardlink and \
+            symlink do not copy any data and runs which are still being written keep growing, reflink makes a copy-on-write \
+            snapshot where the filesystem supports it. Modes fall back to symlink (for hardlinks across filesystems) or copy.\
+            ''')
+        group.add_argument('--controller_threads', metavar='N', type=int, default=8, help='''\
+            The number of runs which are enabled or disabled concurrently by the bulk runsenabler operations.\
+            ''')
+        group.add_argument('--sync_interval', metavar='SECONDS', type=float, default=10.0, help='''\
+            The interval between syncs of the events and json files of enabled runs into the temporary logdir when using the \
+            filesystem controller, so that runs which are still being written are picked up. 0 disables syncing. The \
+            synced events are read by the next reload of the multiplexer (see --reload_interval).\
+            ''')
+        group.add_argument('--sync_max_bytes_per_tick', metavar='BYTES', type=int, default=256 * 1024 * 1024, help='''\
+            The maximum number of bytes copied by each sync of the enabled runs.\
+            ''')
+        group.add_argument('--watch_runs', default=False, help='''\
+            Watch the logdir for runs being added or removed (using inotify on linux, otherwise by polling) rather than \
+            crawling the logdir every time the runsenabler frontend requests the runs.\
+            ''', action='store_true')
+        group.add_argument('--watch_poll_interval', metavar='SECONDS', type=float, default=5.0, help='''\
+            The interval between scans of the logdir when watching runs without inotify.\
+            ''')
+        group.add_argument('--sampling_profiler', default=False, help='''\
+            Start the sampling profiler of the runsenabler routes and jobs at startup. Unlike --enable_profiling it \
+            is cheap enough to leave running, and can also be started and stopped through the /profiler route. The \
+            sampled stacks are served in the collapsed flamegraph format by the /profilerstacks route.\
+            ''', action='store_true')
+        group.add_argument('--sampling_interval_ms', metavar='MS', type=float, default=10.0, help='''\
+            The interval between the samples taken by the sampling profiler, which must be positive.\
+            ''')
+        group.add_argument('--warm_restart', default=False, help='''\
+            Keep the temporary logdir of the filesystem controller when tensorboard exits, along with a state file of \
+            the enabled runs and how much of each of their files has been synced, and reuse both on the next start so \
+            that runs which are still enabled are neither copied nor synced from scratch again.\
+            ''', action='store_true')
+        group.add_argument('--accumulator_snapshots', default=False, help='''\
+            With --warm_restart, save the reservoirs of every accumulator (and how far it has read each events file) \
+            into the temporary logdir when tensorboard exits, so that the next start carries on from them rather than \
+            parsing the events files of the enabled runs again. Requires --use_filesystem_controller and the gr backend \
+            (main.py), whose multiplexer is the only one able to snapshot its accumulators.\
+            ''', action='store_true')
+
+        discovery_group = parser.add_argument_group('run discovery')
+        discovery_group.add_argument('--enable_first_N_runs', metavar='N', type=int, default=-1, help='''\
+            The number of most recently modified runs of the logdir which are enabled at startup. A negative number \
+            enables every run.\
+            ''')
+        discovery_group.add_argument('--discovery_threads', metavar='N', type=int, default=1, help='''\
+            The number of threads used to list directories when crawling the logdir for runs at startup. Values \
+            greater than 1 help on high latency (e.g. network) filesystems.\
+            ''')
+        discovery_group.add_argument('--discovery_stop_at_runs', default=False, help='''\
+            Do not crawl the sub directories of runs when discovering runs at startup (runs nested within runs will not be found).\
+            ''', action='store_true')
+
+        discovery_group.add_argument('--run_mtime_index', metavar='PATH', type=str, default='', help='''\
+            A file in which to save the mtime of every run, so that the next startup can pick the most recent \
+            --enable_first_N_runs runs from it without crawling the logdir (the logdir is then crawled in the background \
+            to update the file). Runs created while tensorboard was not running are not picked until the next startup.\
+            ''')
+        discovery_group.add_argument('--lazy_load', default=False, help='''\
+            Start serving straight away and discover and load the runs enabled at startup in the background, most \
+            recently modified first. Runs which are accessed before they have been loaded are loaded on demand, and \
+            the progress is reported by the runsenabler /status route.\
+            ''', action='store_true')
+        discovery_group.add_argument('--lazy_load_threads', metavar='N', type=int, default=4, help='''\
+            The number of threads loading runs in the background with --lazy_load.\
+            ''')
+
+        guidance_group = parser.add_argument_group('size guidance')
+        guidance_group.add_argument('--tensor_size_guidance', metavar='N', type=int, default=50, help='''\
+            The number of tensor events kept for each tag by default (0 keeps every event).\
+            ''')
+        guidance_group.add_argument('--plugin_tensor_size_guidance', metavar='PLUGIN=N,...', type=str, default='', help='''\
+            The number of tensor events kept for the tags of each plugin, e.g. scalars=1000,histograms=20 (0 keeps every event).\
+            ''')
+        guidance_group.add_argument('--tag_tensor_size_guidance', metavar='REGEX=N,...', type=str, default='', help='''\
+            The number of tensor events kept for tags matching each regex, which overrides the per plugin guidance. \
+            The first matching regex is used.\
+            ''')
+        guidance_group.add_argument('--paramplot_exact_aggregates', default=False, help='''\
+            Keep the exact count, sum, min, max and last value of every scalar tag as its events are read, so that \
+            paramplot aggregates every event of a tag rather than just those kept by the size guidance.\
+            ''', action='store_true')
+
+        cache_group = parser.add_argument_group('caching')
+        cache_group.add_argument('--tensor_cache_mb', metavar='MB', type=int, default=256, help='''\
+            The memory budget of the cache of decoded tensor series shared by the plugins. Its hit, miss and eviction \
+            counts are served by the paramplot /cachestats route.\
+            ''')
 
     def load(self, context):
+        if not 0 < context.flags.sampling_interval_ms < float('inf'):
+            raise ValueError('--sampling_interval_ms must be positive')
+        if context.flags.accumulator_snapshots:
+            if not (context.flags.warm_restart and context.flags.use_filesystem_controller):
+                raise ValueError('--accumulator_snapshots requires --warm_restart and --use_filesystem_controller')
+            if not getattr(context.multiplexer, 'snapshots', False):
+                raise ValueError('--accumulator_snapshots requires the multiplexer of the gr backend')
         # Determine which controller to use - either use the multiplexer directly or manipulate runs at the the filesystem level
-        controller = EventMultiplexerRunsController(context.multiplexer, context.logdir)
+        controller = EventMultiplexerRunsController(context.multiplexer, context.logdir, context.flags.controller_threads)
         if context.flags.use_filesystem_controller:
-            controller = FilesystemRunsController(self.actual_logdir, controller)
+            syncer = None
+            if context.flags.sync_interval > 0:
+                syncer = TailSyncer(self.actual_logdir, context.logdir, context.flags.run_link_mode,
+                                    context.flags.sync_interval, context.flags.sync_max_bytes_per_tick).start()
+            controller = FilesystemRunsController(self.actual_logdir, controller, context.flags.run_link_mode, syncer,
+                                                  context.flags.controller_threads)
+            if context.flags.warm_restart:
+                self._restore(context, controller)
         return self._plugin_class(context, controller)
+
+    def _restore(self, context, controller):
+        # Reuse the runs left in the temporary logdir by the last start before the plugin first reloads the multiplexer
+        controller.state_store = RunStateStore(os.path.join(context.logdir, STATE_FILE_NAME), self.actual_logdir)
+        failures = controller.restore(controller.state_store.load() or {})
+        for run, error in failures.items():
+            _logger.info("failed to restore run " + run + ": " + error)
+        if controller.syncer is not None:
+            controller.syncer.on_synced = controller.save_state
+        self._controller = controller
+        self._multiplexer = context.multiplexer
+        if context.flags.accumulator_snapshots:
+            self._snapshots_dir = os.path.join(context.logdir, SNAPSHOTS_DIR_NAME)
+            _logger.info("restored %d accumulators from snapshots" % restore_snapshots(self._multiplexer, self._snapshots_dir))
+
+    def save_workspace(self):
+        """Saves the state of the enabled runs (and the accumulator snapshots) for the next start with --warm_restart"""
+        if self._controller is None:
+            return
+        if self._controller.syncer is not None:
+            self._controller.syncer.stop()
+        self._controller.save_state()
+        if self._snapshots_dir is not None:
+            _logger.info("saved %d accumulator snapshots" % save_snapshots(self._multiplexer, self._snapshots_dir))
@@ -0,0 +1,36 @@
+import re
+
+_END = ''
+
+def _trie_pattern(node):
+    # Every branch of the trie is a literal character, so the alternation never needs to backtrack into a sibling
+    alternatives = [re.escape(char) + _trie_pattern(child) for char, child in sorted(node.items()) if char != _END]
+    if not alternatives:
+        return ''
+    if len(alternatives) == 1:
+        return alternatives[0]
+    return '(?:' + '|'.join(alternatives) + ')'
+
+def compile_substring_matcher(substrings):
+    """Compiles a regex which matches any string containing at least one of the substrings.
+
+    The substrings are merged into a trie before being turned into a regex, so that the regex engine compares each
+    character of a run name against the trie rather than against every substring in turn. A run can therefore be
+    classified against any number of groups with a single search.
+    """
+    trie = {}
+    for substring in substrings:
+        node = trie
+        for char in substring:
+            if _END in node:
+                # A prefix of this substring is already a group, which matches anything this substring would
+                break
+            node = node.setdefault(char, {})
+        else:
+            # This substring matches anything its longer extensions would, so they can be dropped
+            node.clear()
+            node[_END] = {}
+    if not trie:
+        # No groups, so nothing matches
+        return re.compile(r'(?!)')
+    return re.compile(_trie_pattern(trie))
@@ -0,0 +1,54 @@
+import itertools
+import random
+
+import pytest
+
+from gr_tensorboard.runsenabler.runsenabler_matching import compile_substring_matcher
+
+def _matches(substrings, name):
+    return compile_substring_matcher(substrings).search(name) is not None
+
+def test_no_substrings_matches_nothing():
+    assert not _matches([], '')
+    assert not _matches([], 'run')
+
+def test_empty_substring_matches_everything():
+    assert _matches([''], '')
+    assert _matches(['abc', ''], 'run')
+
+@pytest.mark.parametrize('name, expected', [
+    ('lr=0.1/seed=1', True),
+    ('optimiser=adam', True),
+    ('lr=0.01', True),
+    ('momentum=0.9', False),
+    ('', False),
+])
+def test_matches_any_substring(name, expected):
+    assert _matches(['lr=0.1', 'adam', 'lr=0.01'], name) == expected
+
+def test_shared_prefixes():
+    substrings = ['run_a', 'run_ab', 'run_b', 'ru']
+    assert _matches(substrings, 'xrux')
+    assert not _matches(['run_a', 'run_ab', 'run_b'], 'run_c')
+    assert _matches(['run_ab', 'run_a'], 'run_ax')
+
+def test_special_characters_are_literal():
+    substrings = ['a.b', '(c|d)', 'e*', '[f]', 'g\\h']
+    assert _matches(substrings, 'xa.bx')
+    assert not _matches(substrings, 'axb')
+    assert _matches(substrings, '(c|d)')
+    assert not _matches(substrings, 'c')
+    assert _matches(substrings, 'e*')
+    assert not _matches(substrings, 'eee')
+    assert _matches(substrings, '[f]')
+    assert _matches(substrings, 'g\\h')
+
+def test_agrees_with_substring_search():
+    rng = random.Random(0)
+    for _ in range(200):
+        substrings = [''.join(rng.choice('ab.') for _ in range(rng.randint(1, 4))) for _ in range(rng.randint(1, 5))]
+        matcher = compile_substring_matcher(substrings)
+        for length in range(5):
+            for name in map(''.join, itertools.product('ab.', repeat=length)):
+                expected = any(substring in name for substring in substrings)
+                assert (matcher.search(name) is not None) == expected, (substrings, name)
@@ -22,7 +22,12 @@ from tensorboard.plugins import base_plugin
 from tensorboard.backend.event_processing import plugin_event_accumulator as event_accumulator
 
 from gr_tensorboard.backend import io_helpers
-from .runsenabler_profiler import RunsEnablerLogger, RunsEnablerProfiler, NoOpLogger, NoOpProfiler
+from gr_tensorboard.backend.metrics import get_metrics, instrument_routes
+from gr_tensorboard.backend.reload_coordinator import get_reload_coordinator
+from .runsenabler_profiler import RunsEnablerLogger, RunsEnablerProfiler, NoOpLogger, NoOpProfiler, SamplingProfiler
+from .runsenabler_watcher import RunWatcher
+from .runsenabler_jobs import JobManager, ENABLE, DISABLE
+from .runsenabler_matching import compile_substring_matcher
 
 class RunsEnablerPlugin(base_plugin.TBPlugin):
     """A plugin that controls which runs tensorboard can inspect"""
@@ -49,20 +54,45 @@ class RunsEnablerPlugin(base_plugin.TBPlugin):
         self.default_runs_regex = context.flags.default_runs_regex
         self.controller = controller
         # Load the multiplexer with runs for the first time so that we can reload the accumulators on every added run 
-        # and register all the plugins with gr tensorboard
-        self._multiplexer.Reload()
-        self.runs = self._get_runs()
+        # and register all the plugins with gr tensorboard. Lazily loaded runs are loaded in the background instead
+        self._lazy_loader = getattr(self._multiplexer, 'lazy_loader', None)
+        if self._lazy_loader is None:
+            self._multiplexer.Reload()
+        # Subsequent reloads are shared with the other plugins and only reload the runs which have changed
+        self._reloader = get_reload_coordinator(self._multiplexer, context.flags.reload_interval)
 
         # Create the runsenabler log file which contains profiling times for all the methods
         self.logger = RunsEnablerLogger() if context.flags.enable_profiling else NoOpLogger()
         self.profiler = RunsEnablerProfiler(self.logger) if context.flags.enable_profiling else NoOpProfiler()
+        # The sampling profiler is cheap enough to leave on, and is started and stopped through the /profiler route
+        self.sampler = SamplingProfiler(context.flags.sampling_interval_ms / 1000.0)
+        if context.flags.sampling_profiler:
+            self.sampler.start()
+
+        # Bulk enabling and disabling of runs is done in the background by jobs
+        self.jobs = JobManager(self.controller, self._multiplexer, self.logger, sampler=self.sampler)
+
+        # Whether the frontend last asked for new runs to be enabled as they appear
+        self.enable_new_runs = False
+        self.watcher = None
+        if context.flags.watch_runs:
+            self.watcher = RunWatcher(self.controller.logdir,
+                                      on_runs_added=self._on_runs_added,
+                                      poll_interval=context.flags.watch_poll_interval).start()
+            self.logger.log_message_info("watching for new runs using the %s backend" % self.watcher.backend_name)
+        self.runs = self._get_runs()
+
+        get_metrics().callback('grtensorboard_runs_enabled', 'The runs with accumulators in the multiplexer', 'gauge',
+                               lambda: len(self._multiplexer._accumulators))
+        get_metrics().callback('grtensorboard_jobs_active', 'The bulk enable and disable jobs which have not finished',
+                               'gauge', lambda: self.jobs.num_active())
 
     def get_plugin_apps(self):
         """Gets all routes offered by the plugin.
         """
         # Note that the methods handling routes are decorated with
         # @wrappers.Request.application.
-        return {
+        apps = {
             '/enablerun': self.enablerun_route,
             '/disablerun': self.disablerun_route,
             '/runs': self.runstate_route,
@@ -74,7 +104,15 @@ class RunsEnablerPlugin(base_plugin.TBPlugin):
             '/disablealldisplayedgroups': self.disablealldisplayedgroups_route,
             '/enablealldisplayedgroups': self.enablealldisplayedgroups_route,
             '/defaultregex': self.defaultregex_route,
+            '/runevents': self.runevents_route,
+            '/jobs': self.jobs_route,
+            '/canceljob': self.canceljob_route,
+            '/status': self.status_route,
+            '/profiler': self.profiler_route,
+            '/profilerstacks': self.profilerstacks_route,
         }
+        # Requests are profiled by the sampling profiler (when it is running) under the name of their route
+        return instrument_routes(self.plugin_name, {route: self.sampler.track_route(route, app) for route, app in apps.items()})
 
     def is_active(self):
         """Determines whether this plugin is active.
@@ -106,6 +144,7 @@ class RunsEnablerPlugin(base_plugin.TBPlugin):
         }
         """
         run = request.args.get('run')
+        self.jobs.supersede([run])
         self.controller.enable_run(run)
         return http_util.Respond(request, {}, 'application/json')
 
@@ -124,12 +163,23 @@ class RunsEnablerPlugin(base_plugin.TBPlugin):
         }
         """
         run = request.args.get('run')
+        self.jobs.supersede([run])
         self.controller.disable_run(run)
         return http_util.Respond(request, {}, 'application/json')
 
     def _get_runs(self):
+        if self.watcher is not None:
+            return list(self.watcher.runs)
         return io_helpers.get_run_names(self.controller.logdir)
 
+    def _on_runs_added(self, runs):
+        # Called from the watcher thread as soon as new runs appear in the logdir
+        if self.enable_new_runs:
+            # Enabled by a job rather than on the watcher thread, so that copying the runs neither holds up the watcher
+            # nor blocks the routes reading the multiplexer
+            self.logger.log_message_info("enabling %d new runs found by the watcher" % len(runs))
+            self.jobs.submit(ENABLE, runs, "new runs found by the watcher")
+
     def _get_runstate(self, enable_new_runs=False):
         # This assumes that the run names are entirely described by those sub directories which contains events files (1 per directory)
         run_path_names = self._get_runs()
@@ -158,9 +208,17 @@ class RunsEnablerPlugin(base_plugin.TBPlugin):
             ...
         }
         """
-        enable_new_runs = request.args.get('enableNewRuns')
+        enable_new_runs = request.args.get('enableNewRuns') == 'true'
+        self.enable_new_runs = enable_new_runs
 
         self.logger.log_message_info("executing runstate_route (/runs)")
+        if self.watcher is not None:
+            # The watcher keeps the run set up to date (and enables new runs itself) so there is no need to crawl the logdir
+            self.runs = list(self.watcher.runs)
+            self.run_state = {run: run in self._multiplexer._accumulators for run in self.runs}
+            self._reloader.trigger()
+            return self._reloader.add_snapshot_age_header(http_util.Respond(request, self.run_state, 'application/json'))
+
         with self.profiler.ProfileBlock(), self.profiler.TimeBlock("_get_runstate()"):
             # Handles the case where new runs are added after tensorboard has begun 
             self.run_state, new_runs = self._get_runstate(enable_new_runs)
@@ -168,24 +226,53 @@ class RunsEnablerPlugin(base_plugin.TBPlugin):
             # and reload the multiplexer to delete the runs whose directories have been removed and to create the runs whose directories have just added
             if enable_new_runs:
                 self.controller.enable_runs(new_runs)
-        with self.profiler.TimeBlock("_multiplexer.Reload()"):
-            self._multiplexer.Reload()
+        # Load the newly enabled runs (in the background if the reloads are scheduled)
+        with self.profiler.TimeBlock("_reloader.trigger()"):
+            self._reloader.trigger()
         
         # Update the runs with any new runs in the original logdir and remove any which have been deleted
-        return http_util.Respond(request, self.run_state, 'application/json')
+        return self._reloader.add_snapshot_age_header(http_util.Respond(request, self.run_state, 'application/json'))
  
-    def _add_runs_matching_predicate(self, predicate):
+    @wrappers.Request.application
+    def runevents_route(self, request):
+        """Route to return the runs which the watcher has seen added or removed since the event id provided by the request
+
+        Returns:
+        A JSON serialisation of the events of the form:
+        [
+            {"id": 0, "time": 1546300800.0, "type": "added", "run": "run1"},
+            ...
+        ]
+        """
+        since = self._int_arg(request, 'since', -1)
+        if since is None:
+            return http_util.Respond(request, "since must be an integer", 'text/plain', code=400)
+        events = self.watcher.events_since(since) if self.watcher is not None else []
+        return http_util.Respond(request, events, 'application/json')
+
+    @staticmethod
+    def _int_arg(request, name, default=None):
+        # Returns the integer argument of the request, the default if it is missing or None if it is not an integer
+        value = request.args.get(name)
+        if value is None:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            return None
+
+    def _add_runs_matching_predicate(self, predicate, description):
         runs = [r for r in self.runs if predicate(r)]
         self.logger.log_message_info("number of runs to load: " + str(len(runs)))
-        with self.profiler.TimeBlock("adding all the runs which match the predicate"):
-            self.controller.enable_runs(runs)
+        return self.jobs.submit(ENABLE, runs, description)
 
-    def _remove_runs_matching_predicate(self, predicate):
-        with self._multiplexer._accumulators_mutex:
-            runs = [r for r in self.runs if predicate(r)]
-            self.logger.log_message_info("number of runs to remove: " + str(len(runs)))
-            with self.profiler.TimeBlock("removing all the runs which match predicate"):
-                self.controller.disable_runs(runs)
+    def _remove_runs_matching_predicate(self, predicate, description):
+        runs = [r for r in self.runs if predicate(r)]
+        self.logger.log_message_info("number of runs to remove: " + str(len(runs)))
+        return self.jobs.submit(DISABLE, runs, description)
+
+    def _respond_with_job(self, request, job):
+        return http_util.Respond(request, {"job": job.id if job is not None else None}, 'application/json')
 
     def _format_regex(self, regex):
         regex = regex[1:-1]
@@ -195,79 +282,179 @@ class RunsEnablerPlugin(base_plugin.TBPlugin):
         except re.error:
             return None
 
+    @wrappers.Request.application
+    def jobs_route(self, request):
+        """Route to return the progress of the bulk enable / disable jobs, or of a single job if an id is provided
+
+        Returns:
+        A JSON serialisation of the job(s) of the form:
+        {
+            "id": 0,
+            "action": "enable",
+            "state": "running",
+            "runs_done": 64,
+            "runs_remaining": 436,
+            "bytes_copied": 1073741824,
+            "elapsed": 12.5,
+            ...
+        }
+        """
+        if request.args.get('id') is None:
+            return http_util.Respond(request, self.jobs.describe_all(), 'application/json')
+        job_id = self._int_arg(request, 'id')
+        if job_id is None:
+            return http_util.Respond(request, "id must be an integer", 'text/plain', code=400)
+        response = self.jobs.describe(job_id)
+        return http_util.Respond(request, response, 'application/json')
+
+    @wrappers.Request.application
+    def canceljob_route(self, request):
+        job_id = self._int_arg(request, 'id')
+        if job_id is None:
+            return http_util.Respond(request, "id must be an integer", 'text/plain', code=400)
+        job = self.jobs.cancel(job_id)
+        return self._respond_with_job(request, job)
+
+    @wrappers.Request.application
+    def status_route(self, request):
+        """Route reporting whether the runs enabled at startup have been loaded (see --lazy_load)
+
+        Returns:
+        A JSON object with the progress of the lazy loader (or just ready if runs are not loaded lazily), the number of
+        enabled runs and the age of the last reload
+        """
+        if self._lazy_loader is not None:
+            response = self._lazy_loader.status()
+        else:
+            response = {"lazy": False, "ready": True}
+        response["runs_enabled"] = len(self._multiplexer.Runs())
+        response["snapshot_age"] = self._reloader.snapshot_age
+        return http_util.Respond(request, response, "application/json")
+
+    @wrappers.Request.application
+    def profiler_route(self, request):
+        """Route to control the sampling profiler. action=start (with optional interval_ms and all_threads=true to
+        sample every thread rather than just those handling routes and jobs), action=stop or action=reset (which clears
+        the stacks sampled so far)
+
+        Returns:
+        A JSON object with whether the profiler is running, its interval, the number of samples and distinct stacks
+        taken so far and the time spent sampling
+        """
+        action = request.args.get('action')
+        if action == 'start':
+            interval_ms = request.args.get('interval_ms')
+            try:
+                interval = float(interval_ms) / 1000.0 if interval_ms is not None else None
+            except ValueError:
+                return http_util.Respond(request, "interval_ms must be a number", 'text/plain', code=400)
+            # A zero interval would have the sampler thread spin on a whole cpu
+            if interval is not None and not 0 < interval < float('inf'):
+                return http_util.Respond(request, "interval_ms must be positive", 'text/plain', code=400)
+            all_threads = request.args.get('all_threads')
+            self.sampler.start(interval, None if all_threads is None else all_threads == 'true')
+        elif action == 'stop':
+            self.sampler.stop()
+        elif action == 'reset':
+            self.sampler.reset()
+        elif action is not None:
+            return http_util.Respond(request, "Unknown action: " + action, 'text/plain', code=400)
+        return http_util.Respond(request, self.sampler.status(), 'application/json')
+
+    @wrappers.Request.application
+    def profilerstacks_route(self, request):
+        """Route returning the stacks sampled by the sampling profiler in the collapsed format, which flamegraph.pl
+        and speedscope turn into a flamegraph"""
+        return http_util.Respond(request, self.sampler.collapsed(), 'text/plain')
+
     @wrappers.Request.application
     def enableall_route(self, request):
         regex = self._format_regex(request.args.get('regex'))    
+        job = None
         if regex:
             self.logger.log_message_info("executing enableall_route (/enableall)")
             with self.profiler.ProfileBlock():
-                self._add_runs_matching_predicate(lambda run: run not in self._multiplexer._accumulators and re.search(regex, run))
+                job = self._add_runs_matching_predicate(lambda run: run not in self._multiplexer._accumulators and re.search(regex, run),
+                                                        "/enableall " + regex.pattern)
 
-        return http_util.Respond(request, {}, 'application/json')
+        return self._respond_with_job(request, job)
     
     @wrappers.Request.application
     def disableall_route(self, request):
         regex = self._format_regex(request.args.get('regex'))
+        job = None
         if regex:
             self.logger.log_message_info("executing disableall_route (/disableall)")
             with self.profiler.ProfileBlock():
-                self._remove_runs_matching_predicate(lambda run: run in self._multiplexer._accumulators and re.search(regex, run))
+                job = self._remove_runs_matching_predicate(lambda run: run in self._multiplexer._accumulators and re.search(regex, run),
+                                                           "/disableall " + regex.pattern)
             
-        return http_util.Respond(request, {}, 'application/json')
+        return self._respond_with_job(request, job)
     
     @wrappers.Request.application
     def disablenonmatching_route(self, request):
         regex = self._format_regex(request.args.get('regex'))
+        job = None
         if regex:
             self.logger.log_message_info("executing disableallnonmatching_route (/disableallnonmatching)")
             with self.profiler.ProfileBlock():
-                self._remove_runs_matching_predicate(lambda run: run in self._multiplexer._accumulators and not re.search(regex, run))
+                job = self._remove_runs_matching_predicate(lambda run: run in self._multiplexer._accumulators and not re.search(regex, run),
+                                                           "/disablenonmatching " + regex.pattern)
             
-        return http_util.Respond(request, {}, 'application/json')
+        return self._respond_with_job(request, job)
     
     @wrappers.Request.application
     def enableallsubstring_route(self, request):
         subregex = self._format_regex(request.args.get('subregex'))
         substring = request.args.get('substring')
+        job = None
         if subregex:
             self.logger.log_message_info("executing enableallsubstring_route (/enableallsubstring)")
             with self.profiler.ProfileBlock():
-                self._add_runs_matching_predicate(lambda run: run not in self._multiplexer._accumulators and substring in run and re.search(subregex, run))
+                job = self._add_runs_matching_predicate(lambda run: run not in self._multiplexer._accumulators and substring in run and re.search(subregex, run),
+                                                        "/enableallsubstring " + substring)
 
-        return http_util.Respond(request, {}, 'application/json')
+        return self._respond_with_job(request, job)
     
     @wrappers.Request.application
     def disableallsubstring_route(self, request):
         subregex = self._format_regex(request.args.get('subregex'))
         substring = request.args.get('substring')
+        job = None
         if subregex:
             self.logger.log_message_info("executing disableallsubstring_route (/disableallsubstring)")
             with self.profiler.ProfileBlock():
-                self._remove_runs_matching_predicate(lambda run: run in self._multiplexer._accumulators and substring in run and re.search(subregex, run))
+                job = self._remove_runs_matching_predicate(lambda run: run in self._multiplexer._accumulators and substring in run and re.search(subregex, run),
+                                                           "/disableallsubstring " + substring)
 
-        return http_util.Respond(request, {}, 'application/json')
+        return self._respond_with_job(request, job)
     
     @wrappers.Request.application
     def disablealldisplayedgroups_route(self, request):
         subregex = self._format_regex(request.args.get('subregex'))
         substrings = json.loads(request.form.get("groups"))
+        job = None
         if subregex:
             self.logger.log_message_info("executing disablealldisplayedgroups_route (/disablealldisplayedgroups)")
             with self.profiler.ProfileBlock():
-                for substring in substrings:
-                    self._remove_runs_matching_predicate(lambda run: run in self._multiplexer._accumulators and substring in run and re.search(subregex, run))
+                groups = compile_substring_matcher(substrings)
+                job = self._remove_runs_matching_predicate(
+                    lambda run: run in self._multiplexer._accumulators and groups.search(run) and subregex.search(run),
+                    "/disablealldisplayedgroups %d groups" % len(substrings))
         
-        return http_util.Respond(request, {}, 'application/json')
+        return self._respond_with_job(request, job)
 
     @wrappers.Request.application
     def enablealldisplayedgroups_route(self, request):
         subregex = self._format_regex(request.args.get('subregex'))
         substrings = json.loads(request.form.get("groups"))
+        job = None
         if subregex:
             self.logger.log_message_info("executing enablealldisplayedgroups_route (/enablealldisplayedgroups)")
             with self.profiler.ProfileBlock():
-                for substring in substrings:
-                    self._add_runs_matching_predicate(lambda run: run not in self._multiplexer._accumulators and substring in run and re.search(subregex, run))
+                groups = compile_substring_matcher(substrings)
+                job = self._add_runs_matching_predicate(
+                    lambda run: run not in self._multiplexer._accumulators and groups.search(run) and subregex.search(run),
+                    "/enablealldisplayedgroups %d groups" % len(substrings))
 
-        return http_util.Respond(request, {}, 'application/json')
-    
+        return self._respond_with_job(request, job)
@@ -1,7 +1,10 @@
 import time
 import calendar
+import collections
 import os
 import logging
+import sys
+import threading
 
 import cProfile, pstats, io
 
@@ -93,4 +96,164 @@ class NoOpLogger:
         pass
     
     def log_message_debug(self, message):
-        pass
\ No newline at end of file
+        pass
+
+# The (profiler, label) of the innermost track block of each thread
+_current_track = threading.local()
+
+def propagate_track(func):
+    """Wraps func so that when it runs on another thread (e.g. a worker of a thread pool) that thread is profiled under
+    the track block which the calling thread is in, if any"""
+    block = getattr(_current_track, 'block', None)
+    if block is None:
+        return func
+    profiler, label = block
+    def tracked(*args, **kwargs):
+        with profiler.track(label):
+            return func(*args, **kwargs)
+    return tracked
+
+class SamplingProfiler:
+    """A statistical profiler which is cheap enough to leave running in production.
+
+    Rather than tracing every call like cProfile, a background thread reads the stack of each profiled thread from
+    sys._current_frames every interval and counts how often each stack is seen. Only threads within a track block (e.g.
+    handling a runsenabler route or running a job) are profiled, unless all_threads is set, and each stack is rooted
+    at the label of its track block. The counts are kept in memory, bounded by max_stacks distinct stacks, and are
+    returned in the collapsed format read by flamegraph.pl and speedscope.
+    """
+    def __init__(self, interval=0.01, max_depth=128, max_stacks=20000):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.all_threads = False
+        self.num_samples = 0
+        # The time spent taking samples, to keep an eye on the overhead of the profiler
+        self.sampling_time = 0.0
+        self._stacks = collections.Counter()
+        # Maps the ident of each thread within a track block to its label
+        self._tracked = {}
+        # Cache of the formatted name of each code object seen
+        self._names = {}
+        self._lock = threading.Lock()
+        self._stop_event = None
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval=None, all_threads=None):
+        with self._lock:
+            if interval is not None:
+                self.interval = interval
+            if all_threads is not None:
+                self.all_threads = all_threads
+            if self._thread is None:
+                self._stop_event = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stop_event,), name='SamplingProfiler')
+                self._thread.daemon = True
+                self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                self._stop_event.set()
+        if thread is not None:
+            thread.join()
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._names.clear()
+            self.num_samples = 0
+            self.sampling_time = 0.0
+
+    def track(self, label):
+        """Returns a context manager within which the current thread is profiled under the label"""
+        return _TrackBlock(self, label)
+
+    def track_route(self, label, app):
+        """Wraps a wsgi app so that the threads handling it are profiled under the label"""
+        def tracked(environ, start_response):
+            with self.track(label):
+                return app(environ, start_response)
+        return tracked
+
+    def _name(self, code):
+        name = self._names.get(code)
+        if name is None:
+            name = self._names[code] = '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+        return name
+
+    def _sample(self):
+        own_ident = threading.get_ident()
+        frames = sys._current_frames()
+        if self.all_threads:
+            labels = {thread.ident: thread.name for thread in threading.enumerate()}
+        else:
+            labels = dict(self._tracked)
+        with self._lock:
+            for ident, frame in frames.items():
+                label = labels.get(ident)
+                if label is None or ident == own_ident:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    names.append(self._name(frame.f_code))
+                    frame = frame.f_back
+                names.append(label)
+                stack = ';'.join(reversed(names))
+                if stack not in self._stacks and len(self._stacks) >= self.max_stacks:
+                    # Keep counting the samples of new stacks once the limit is hit, just not where they were
+                    stack = label + ';[other]'
+                self._stacks[stack] += 1
+            self.num_samples += 1
+
+    def _run(self, stop_event):
+        while not stop_event.wait(self.interval):
+            start = time.time()
+            self._sample()
+            self.sampling_time += time.time() - start
+
+    def collapsed(self):
+        """Returns the stacks seen so far in the collapsed flamegraph format: one 'frame;frame;frame count' per line"""
+        with self._lock:
+            stacks = sorted(self._stacks.items())
+        return ''.join('%s %d\n' % (stack, count) for stack, count in stacks)
+
+    def status(self):
+        with self._lock:
+            return {
+                'running': self.running,
+                'interval': self.interval,
+                'all_threads': self.all_threads,
+                'samples': self.num_samples,
+                'stacks': len(self._stacks),
+                'sampling_time': self.sampling_time,
+            }
+
+class _TrackBlock:
+    def __init__(self, profiler, label):
+        self.profiler = profiler
+        self.label = label
+        self.previous = None
+        self.previous_block = None
+
+    def __enter__(self):
+        ident = threading.get_ident()
+        self.previous = self.profiler._tracked.get(ident)
+        self.profiler._tracked[ident] = self.label
+        self.previous_block = getattr(_current_track, 'block', None)
+        _current_track.block = (self.profiler, self.label)
+        return self
+
+    def __exit__(self, t, v, traceback):
+        ident = threading.get_ident()
+        _current_track.block = self.previous_block
+        if self.previous is None:
+            self.profiler._tracked.pop(ident, None)
+        else:
+            self.profiler._tracked[ident] = self.previous
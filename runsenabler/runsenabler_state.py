@@ -0,0 +1,49 @@
+import json
+import os
+import tempfile
+import threading
+
+from gr_tensorboard.backend.logging import get_logger
+
+_logger = get_logger()
+
+# The names of the state file and the accumulator snapshots within the temporary logdir
+STATE_FILE_NAME = '.runsenabler_state.json'
+SNAPSHOTS_DIR_NAME = '.accumulator_snapshots'
+
+class RunStateStore:
+    """Saves the runs enabled in the temporary logdir of the filesystem controller, along with what the syncer has
+    copied of each of their files, so that a restarted tensorboard can reuse the temporary logdir instead of copying
+    every run again.
+
+    The state is a compact json file mapping each run to its files: the bytes copied of an events file, the
+    [mtime, size] copied of a json file or null for a linked file. It is replaced atomically on every save.
+    """
+    def __init__(self, path, logdir):
+        self.path = str(path)
+        self.logdir = str(logdir)
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Returns the saved {run: files} of the logdir, or None if there is no (readable) state for it"""
+        try:
+            with open(self.path, 'r') as state_file:
+                state = json.load(state_file)
+        except (OSError, ValueError):
+            return None
+        if state.get('logdir') != self.logdir:
+            return None
+        # Json has no tuples, so turn the json file versions back into the (mtime, size) tuples the syncer compares
+        return {run: {name: tuple(value) if isinstance(value, list) else value for name, value in files.items()}
+                for run, files in state.get('runs', {}).items()}
+
+    def save(self, runs):
+        """Saves the {run: files} of every enabled run"""
+        with self._lock:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            try:
+                with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as state_file:
+                    json.dump({'logdir': self.logdir, 'runs': runs}, state_file, separators=(',', ':'))
+                os.replace(state_file.name, self.path)
+            except OSError as e:
+                _logger.info("failed to save the runsenabler state to " + self.path + ": " + str(e))
@@ -0,0 +1,211 @@
+import os
+import shutil
+import threading
+
+from gr_tensorboard.backend.logging import get_logger
+from gr_tensorboard.backend.run_index import is_events_file
+from .runsenabler_controller import bytes_copied_metric, link_file, COPY, HARDLINK, SYMLINK
+
+_logger = get_logger()
+
+# Size of the reads used when appending new events to a copied events file
+_CHUNK_BYTES = 1024 * 1024
+
+# A json file version which never matches a real one, so that the json file is copied by the next sync
+_STALE_VERSION = (-1, -1)
+
+class TailSyncer:
+    """Keeps the copies of enabled runs in the temporary logdir up to date with the runs in the actual logdir.
+
+    For each copied events file the syncer remembers how many bytes have been copied and appends only the bytes
+    written since, so the EventAccumulator reading the copy sees the file grow just as it would for the original.
+    New (e.g. rotated) events files and changed json files (e.g. runparams.json) are picked up as well. Files which
+    were hardlinked or symlinked share their data with the original so are never synced.
+
+    All enabled runs are synced in one batch every interval, copying at most max_bytes_per_tick bytes per batch.
+    When the cap is hit the next batch carries on from the run where the last one stopped. Runs are copied without
+    holding the lock, so that enabling, disabling and saving the runs never waits for a large copy to finish.
+    """
+    def __init__(self, logdir, temp_logdir, link_mode=COPY, interval=10.0, max_bytes_per_tick=256 * 1024 * 1024):
+        self.logdir = str(logdir)
+        self.temp_logdir = str(temp_logdir)
+        self.link_mode = link_mode
+        self.interval = interval
+        self.max_bytes_per_tick = max_bytes_per_tick
+        # Maps each enabled run to its files: the bytes copied for an events file, the (mtime, size) copied for
+        # a json file or None for a linked file
+        self._runs = {}
+        self._next_run = 0
+        self._lock = threading.Lock()
+        # The run being synced, if any, and a condition notified whenever a run has finished syncing
+        self._syncing = None
+        self._synced = threading.Condition(self._lock)
+        # Optional callback made after each sync which copied anything, e.g. to save the state of the enabled runs
+        self.on_synced = None
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='TailSyncer')
+        self._thread.daemon = True
+
+    def _is_linked(self, src, dst):
+        return os.path.islink(dst) or (os.path.exists(src) and os.path.samefile(src, dst))
+
+    def _copied_files(self, run, json_version):
+        src_dir = os.path.join(self.logdir, run)
+        dst_dir = os.path.join(self.temp_logdir, run)
+        files = {}
+        for name in os.listdir(dst_dir):
+            src = os.path.join(src_dir, name)
+            dst = os.path.join(dst_dir, name)
+            if self._is_linked(src, dst):
+                files[name] = None
+            elif is_events_file(name):
+                # The copy of an events file is always a prefix of the original, so its size is the offset to sync from
+                files[name] = os.path.getsize(dst)
+            elif os.path.exists(src):
+                files[name] = json_version(name, src)
+        return files
+
+    def add_run(self, run):
+        """Starts syncing a run which has just been copied into the temporary logdir"""
+        def current_version(name, src):
+            stat = os.stat(src)
+            return (stat.st_mtime_ns, stat.st_size)
+        files = self._copied_files(run, current_version)
+        with self._lock:
+            self._runs[run] = files
+
+    def restore_run(self, run, saved_files):
+        """Starts syncing a run left in the temporary logdir by a previous process, given the files it saved.
+
+        A json file is only considered up to date if it has the version the previous process copied, so json files
+        which changed while tensorboard was not running are copied again by the next sync.
+        """
+        files = self._copied_files(run, lambda name, src: tuple(saved_files.get(name) or _STALE_VERSION))
+        with self._lock:
+            self._runs[run] = files
+
+    def run_files(self):
+        """Returns a copy of the files of every enabled run, as described for _runs"""
+        with self._lock:
+            return {run: dict(files) for run, files in self._runs.items()}
+
+    def remove_run(self, run):
+        with self._lock:
+            self._runs.pop(run, None)
+            # A sync of the run stops after its current chunk once it sees the run has gone, so this only waits for
+            # that chunk rather than the whole copy before the caller removes the run's directory
+            while self._syncing == run:
+                self._synced.wait()
+
+    def _append(self, src, dst, offset, num_bytes, cancelled):
+        with open(src, 'rb') as src_handle, open(dst, 'ab') as dst_handle:
+            src_handle.seek(offset)
+            remaining = num_bytes
+            while remaining > 0 and not cancelled():
+                chunk = src_handle.read(min(_CHUNK_BYTES, remaining))
+                if not chunk:
+                    break
+                dst_handle.write(chunk)
+                remaining -= len(chunk)
+        return num_bytes - remaining
+
+    def _sync_events_file(self, files, entry, dst_dir, budget, cancelled):
+        dst = os.path.join(dst_dir, entry.name)
+        if entry.name not in files:
+            # A new events file - link it if we can, otherwise start an empty copy which is filled in below
+            if self.link_mode == COPY:
+                open(dst, 'wb').close()
+                files[entry.name] = 0
+            else:
+                mode = link_file(entry.path, dst_dir, self.link_mode)
+                files[entry.name] = None if mode in (HARDLINK, SYMLINK) else os.path.getsize(dst)
+        offset = files[entry.name]
+        if offset is None:
+            return 0
+        size = entry.stat().st_size
+        if size < offset:
+            # The original was truncated or replaced so copy it again from the start
+            open(dst, 'wb').close()
+            offset = files[entry.name] = 0
+        copied = self._append(entry.path, dst, offset, min(size - offset, budget), cancelled)
+        files[entry.name] = offset + copied
+        return copied
+
+    def _sync_json_file(self, files, entry, dst_dir):
+        if entry.name in files and files[entry.name] is None:
+            return 0
+        stat = entry.stat()
+        version = (stat.st_mtime_ns, stat.st_size)
+        if files.get(entry.name) == version:
+            return 0
+        # Replace the copy atomically so that readers never see a partially written file
+        dst = os.path.join(dst_dir, entry.name)
+        shutil.copy(entry.path, dst + '.sync')
+        os.replace(dst + '.sync', dst)
+        files[entry.name] = version
+        return stat.st_size
+
+    def _sync_run(self, run, files, budget, cancelled):
+        src_dir = os.path.join(self.logdir, run)
+        dst_dir = os.path.join(self.temp_logdir, run)
+        copied = 0
+        with os.scandir(src_dir) as entries:
+            for entry in entries:
+                if copied >= budget or cancelled():
+                    break
+                if is_events_file(entry.name):
+                    copied += self._sync_events_file(files, entry, dst_dir, budget - copied, cancelled)
+                elif entry.name.endswith('.json'):
+                    copied += self._sync_json_file(files, entry, dst_dir)
+        return copied
+
+    def sync(self):
+        """Syncs the enabled runs once, returning the number of bytes which were copied"""
+        with self._lock:
+            runs = sorted(self._runs)
+        if not runs:
+            return 0
+        start = self._next_run % len(runs)
+        copied = 0
+        for position in range(len(runs)):
+            run = runs[(start + position) % len(runs)]
+            if copied >= self.max_bytes_per_tick:
+                # Pick up from this run on the next tick so that every run is eventually synced
+                self._next_run = start + position
+                bytes_copied_metric.inc(copied, source='sync')
+                return copied
+            with self._lock:
+                enabled_files = self._runs.get(run)
+                if enabled_files is None:
+                    continue
+                self._syncing = run
+            # Copy outside the lock, stopping early if the run is disabled (or enabled again) meanwhile
+            files = dict(enabled_files)
+            def cancelled(run=run, enabled_files=enabled_files):
+                return self._runs.get(run) is not enabled_files
+            try:
+                copied += self._sync_run(run, files, self.max_bytes_per_tick - copied, cancelled)
+            except OSError as e:
+                _logger.info("failed to sync run " + run + ": " + str(e))
+            finally:
+                with self._lock:
+                    if self._runs.get(run) is enabled_files:
+                        self._runs[run] = files
+                    self._syncing = None
+                    self._synced.notify_all()
+        self._next_run = start
+        bytes_copied_metric.inc(copied, source='sync')
+        return copied
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            if self.sync() and self.on_synced is not None:
+                self.on_synced()
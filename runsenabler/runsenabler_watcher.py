@@ -0,0 +1,181 @@
+import collections
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import sys
+import threading
+import time
+
+from gr_tensorboard.backend.logging import get_logger
+from gr_tensorboard.backend.run_index import get_run_index
+
+_logger = get_logger()
+
+# inotify constants from <sys/inotify.h>
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_ONLYDIR = 0x01000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = _IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR
+
+# Changes to a directory tend to arrive in bursts (e.g. a run directory followed by its events file)
+_DEBOUNCE_SECONDS = 0.2
+
+class PollingBackend:
+    """Portable backend which reports a possible change every poll interval"""
+    name = 'polling'
+
+    def __init__(self, poll_interval):
+        self.poll_interval = poll_interval
+
+    def sync_watches(self, directories):
+        pass
+
+    def wait(self, stop_event):
+        stop_event.wait(self.poll_interval)
+
+    def close(self):
+        pass
+
+class InotifyBackend:
+    """Linux backend which blocks until inotify reports a directory being created, deleted or moved in the tree
+
+    Events for files being appended to are not watched, as they never change the set of runs. A full resync is
+    still done every resync interval in case events were dropped by the kernel.
+    """
+    name = 'inotify'
+
+    def __init__(self, resync_interval):
+        self.resync_interval = resync_interval
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches = {}
+
+    def sync_watches(self, directories):
+        directories = set(directories)
+        for path in directories.difference(self._watches):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    # Out of watches (fs.inotify.max_user_watches) - let the watcher fall back to polling
+                    raise OSError(error, "inotify watch limit reached")
+                # The directory was removed before we could watch it, the next sync will drop it
+                continue
+            self._watches[path] = wd
+        for path in set(self._watches).difference(directories):
+            # The kernel removes the watch of a deleted directory itself, in which case this fails harmlessly
+            self._libc.inotify_rm_watch(self._fd, self._watches.pop(path))
+
+    def _drain(self):
+        try:
+            while os.read(self._fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+
+    def wait(self, stop_event):
+        deadline = time.time() + self.resync_interval
+        while not stop_event.is_set() and time.time() < deadline:
+            # Wake up regularly so that the watcher can be stopped
+            readable, _, _ = select.select([self._fd], [], [], min(1.0, max(0.0, deadline - time.time())))
+            if readable:
+                time.sleep(_DEBOUNCE_SECONDS)
+                self._drain()
+                return
+
+    def close(self):
+        os.close(self._fd)
+
+class RunWatcher:
+    """Keeps the set of runs under a logdir in memory, updating it in a background thread as runs come and go.
+
+    Added and removed runs are recorded as events (each with an increasing id so that clients can ask for the
+    events since the last one they saw) and the on_runs_added callback is called with each batch of new runs.
+    """
+    def __init__(self, logdir, on_runs_added=None, poll_interval=5.0, resync_interval=60.0, max_events=10000):
+        self.logdir = str(logdir)
+        self._index = get_run_index(self.logdir)
+        self._on_runs_added = on_runs_added
+        self._events = collections.deque(maxlen=max_events)
+        self._next_event_id = 0
+        self._events_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._backend = self._create_backend(poll_interval, resync_interval)
+        self._poll_interval = poll_interval
+        self.runs = frozenset(self._index.run_names())
+        self._sync_watches()
+        self._thread = threading.Thread(target=self._run, name='RunWatcher')
+        self._thread.daemon = True
+
+    def _create_backend(self, poll_interval, resync_interval):
+        if sys.platform.startswith('linux'):
+            try:
+                return InotifyBackend(resync_interval)
+            except (OSError, AttributeError):
+                pass
+        return PollingBackend(poll_interval)
+
+    def _sync_watches(self):
+        try:
+            self._backend.sync_watches(self._index.directories())
+        except OSError:
+            self._backend.close()
+            self._backend = PollingBackend(self._poll_interval)
+
+    @property
+    def backend_name(self):
+        return self._backend.name
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread.join()
+        self._backend.close()
+
+    def _record_events(self, event_type, runs):
+        with self._events_lock:
+            for run in sorted(runs):
+                self._events.append({"id": self._next_event_id, "time": time.time(), "type": event_type, "run": run})
+                self._next_event_id += 1
+
+    def events_since(self, event_id=-1):
+        """Returns the recorded events with an id greater than event_id"""
+        with self._events_lock:
+            return [event for event in self._events if event["id"] > event_id]
+
+    def update(self):
+        """Refreshes the run set from the filesystem, recording the runs which were added or removed"""
+        new_runs = frozenset(self._index.run_names())
+        added_runs = new_runs.difference(self.runs)
+        removed_runs = self.runs.difference(new_runs)
+        self.runs = new_runs
+        self._sync_watches()
+        self._record_events("added", added_runs)
+        self._record_events("removed", removed_runs)
+        if added_runs and self._on_runs_added is not None:
+            self._on_runs_added(sorted(added_runs))
+        return added_runs, removed_runs
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._backend.wait(self._stop_event)
+            if self._stop_event.is_set():
+                break
+            try:
+                self.update()
+            except Exception as e:
+                # Never let a transient filesystem error kill the watcher thread
+                _logger.info("run watcher failed to update: " + str(e))